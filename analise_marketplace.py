@@ -0,0 +1,187 @@
+from datetime import timedelta
+
+import numpy as np
+import pandas as pd
+
+from perfil_marketplace import medir
+from resultados_marketplace import memoizar
+
+
+# --- COMPARAÇÃO COM O PERÍODO ANTERIOR ---
+def get_periodo_anterior(data_inicio_atual, data_fim_atual):
+    duracao = (data_fim_atual - data_inicio_atual)
+    fim_anterior = data_inicio_atual - timedelta(days=1)
+    inicio_anterior = fim_anterior - duracao
+    return inicio_anterior, fim_anterior
+
+
+def variacao_percentual(atual, anterior):
+    """Delta relativo para st.metric, ou None quando o período anterior não tem base."""
+    if anterior is None or pd.isna(anterior) or pd.isna(atual) or anterior == 0:
+        return None
+    return f"{(atual - anterior) / anterior:+.1%}"
+
+
+def variacao_absoluta(atual, anterior, formato="{:+.2f}"):
+    if anterior is None or pd.isna(anterior) or pd.isna(atual):
+        return None
+    return formato.format(atual - anterior)
+
+
+def comparacao(valor_anterior, formato="{}"):
+    # Trecho " (período anterior: ...)" das respostas do bot.
+    if valor_anterior is None or pd.isna(valor_anterior):
+        return ""
+    return f" (período anterior: **{formato.format(valor_anterior)}**)"
+
+
+# --- MÉTRICAS POR VENDEDOR ---
+LIMITE_ATRASO_DIAS = 25  # entregas acima disso contam como atrasadas nas respostas do bot
+COLUNAS_VENDEDORES = ["seller_id", "payment_value", "review_score", "tempo_entrega", "atraso"]
+
+
+def somas_vendedores(df, limite_atraso=LIMITE_ATRASO_DIAS):
+    """Somas e contagens por loja; as de partes disjuntas da base podem ser somadas entre si."""
+    valor = df["payment_value"].to_numpy(dtype=np.float64, na_value=np.nan)
+    nota = df["review_score"].to_numpy(dtype=np.float64, na_value=np.nan)
+    tempo = df["tempo_entrega"].to_numpy(dtype=np.float64, na_value=np.nan)
+    com_nota = ~np.isnan(nota)
+    lenta, no_prazo = tempo > limite_atraso, tempo <= limite_atraso
+    base = pd.DataFrame({
+        "seller_id": df["seller_id"].to_numpy(),
+        "pedidos": np.ones(len(df), dtype=np.int64),
+        "faturamento": np.nan_to_num(valor),
+        "valor_cont": ~np.isnan(valor),
+        "nota_soma": np.nan_to_num(nota),
+        "nota_cont": com_nota,
+        "tempo_soma": np.nan_to_num(tempo),
+        "tempo_cont": ~np.isnan(tempo),
+        "atraso_soma": df["atraso"].to_numpy(dtype=np.float64),
+        "entregas_lentas": lenta,
+        "entregas_no_prazo": no_prazo,
+        "nota_lenta_soma": np.where(lenta & com_nota, nota, 0.0),
+        "nota_lenta_cont": lenta & com_nota,
+        "nota_no_prazo_soma": np.where(no_prazo & com_nota, nota, 0.0),
+        "nota_no_prazo_cont": no_prazo & com_nota,
+    })
+    return base.groupby("seller_id").sum()
+
+
+def tabela_de_somas(somas):
+    """A tabela de tabela_vendedores a partir das somas de somas_vendedores."""
+    return pd.DataFrame({
+        "pedidos": somas["pedidos"],
+        "faturamento": somas["faturamento"],
+        "ticket_medio": somas["faturamento"] / somas["valor_cont"],
+        "nota_media": somas["nota_soma"] / somas["nota_cont"],
+        "tempo_medio": somas["tempo_soma"] / somas["tempo_cont"],
+        "pct_atraso": somas["atraso_soma"] / somas["pedidos"],
+        "entregas_lentas": somas["entregas_lentas"],
+        "entregas_no_prazo": somas["entregas_no_prazo"],
+        "nota_lenta_soma": somas["nota_lenta_soma"],
+        "nota_lenta_cont": somas["nota_lenta_cont"],
+        "nota_no_prazo_soma": somas["nota_no_prazo_soma"],
+        "nota_no_prazo_cont": somas["nota_no_prazo_cont"],
+    })
+
+
+def tabela_vendedores(versao, data_inicio, data_fim):
+    """Uma linha por loja com as métricas do período, calculadas em um único groupby."""
+    if hasattr(versao.pedidos, "vendedores"):
+        # Backend SQL: o mesmo agrupamento roda no banco; particionado: junta as somas gravadas por mês.
+        return versao.pedidos.vendedores(data_inicio, data_fim, LIMITE_ATRASO_DIAS)
+    with medir("filtro/periodo"):
+        df = versao.pedidos.periodo(data_inicio, data_fim, COLUNAS_VENDEDORES)
+    with medir("agregado/vendedores"):
+        return tabela_de_somas(somas_vendedores(df))
+
+
+def vendedores_periodo(versao, data_inicio, data_fim):
+    # Memoizada por (versão da base, data_inicio, data_fim) no cache de resultados do processo.
+    with medir("tabela_vendedores"):
+        return memoizar(
+            ("tabela_vendedores", versao.numero, data_inicio, data_fim),
+            lambda: tabela_vendedores(versao, data_inicio, data_fim),
+        )
+
+
+# --- RESPOSTAS DO BOT ---
+def concentracao_top_10(vendedores):
+    faturamento_total = vendedores['faturamento'].sum()
+    if faturamento_total > 0:
+        return vendedores['faturamento'].nlargest(10).sum() / faturamento_total
+    return None
+
+
+def desempenho(vendedores):
+    alta_performance = int(((vendedores['pedidos'] > 10) & (vendedores['nota_media'] >= 4.5)).sum())
+    em_risco = int(((vendedores['pedidos'] < 5) & (vendedores['nota_media'] < 3.5)).sum())
+    return len(vendedores), alta_performance, em_risco
+
+
+def notas_por_atraso(vendedores):
+    totais = vendedores.sum()
+    if totais['entregas_lentas'] > 0 and totais['entregas_no_prazo'] > 0:
+        return (
+            totais['nota_lenta_soma'] / totais['nota_lenta_cont'],
+            totais['nota_no_prazo_soma'] / totais['nota_no_prazo_cont'],
+        )
+    return None
+
+
+def gerar_resposta_analitica(pergunta, versao, data_inicio, data_fim):
+    pergunta = pergunta.lower()
+    vendedores = vendedores_periodo(versao, data_inicio, data_fim)
+    if vendedores.empty:
+        return "Não encontrei dados para o período selecionado."
+    # A tabela do período anterior também é memoizada; vazia quando não há dados antes do período.
+    anteriores = vendedores_periodo(versao, *get_periodo_anterior(data_inicio, data_fim))
+    tem_anterior = not anteriores.empty
+
+    if "concentração de vendas" in pergunta:
+        concentracao = concentracao_top_10(vendedores)
+        if concentracao is not None:
+            anterior = concentracao_top_10(anteriores) if tem_anterior else None
+            insight = "Isso indica uma alta dependência dos seus principais vendedores." if concentracao > 0.5 else "Isso mostra um ecossistema bem diversificado e saudável."
+            return f"📊 As 10 maiores lojas representam **{concentracao:.1%}**{comparacao(anterior, '{:.1%}')} do faturamento total. {insight}"
+        else:
+            return "Não há faturamento no período para calcular a concentração."
+
+    elif "desempenho dos vendedores" in pergunta:
+        total_vendedores, alta_performance, em_risco = desempenho(vendedores)
+        total_ant, alta_ant, risco_ant = desempenho(anteriores) if tem_anterior else (None, None, None)
+        return (
+            f"📈 Analisando **{total_vendedores}** vendedores{comparacao(total_ant)}:\n"
+            f"- **Alta Performance:** {alta_performance}{comparacao(alta_ant)}\n"
+            f"- **Em Risco:** {em_risco}{comparacao(risco_ant)}"
+        )
+
+    elif "atrasos afetam avaliações" in pergunta:
+        notas = notas_por_atraso(vendedores)
+        if notas is not None:
+            nota_com_atraso, nota_sem_atraso = notas
+            com_ant, sem_ant = (notas_por_atraso(anteriores) if tem_anterior else None) or (None, None)
+            return (
+                f"📉 Sim, a nota média para entregas com atraso é **{nota_com_atraso:.2f}**{comparacao(com_ant, '{:.2f}')}, "
+                f"enquanto para entregas no prazo é **{nota_sem_atraso:.2f}**{comparacao(sem_ant, '{:.2f}')}."
+            )
+        else:
+            return "✅ Não há dados suficientes para comparar."
+
+    elif "loja com mais pedidos" in pergunta:
+        loja_top_id = vendedores['pedidos'].idxmax()
+        pedidos_ant = anteriores['pedidos'].get(loja_top_id) if tem_anterior else None
+        return (
+            f"🏆 A loja com mais pedidos é a **{loja_top_id}**, com **{vendedores['pedidos'].max()}** pedidos"
+            f"{comparacao(pedidos_ant)}."
+        )
+
+    else:
+        return """
+        🤖 Desculpe, não entendi. Tente uma das perguntas abaixo:
+
+        * `Qual a concentração de vendas?`
+        * `Como está o desempenho dos vendedores?`
+        * `Atrasos afetam avaliações?`
+        * `Qual a loja com mais pedidos?`
+        """
@@ -0,0 +1,256 @@
+import os
+import threading
+import time
+from dataclasses import dataclass
+
+import pandas as pd
+import streamlit as st
+
+from compartilhado_marketplace import PASTA_COMPARTILHADA, abrir_versao, versao_publicada
+from cubo_marketplace import CuboVendas, montar_cubo
+from dados_marketplace import (
+    anexar_pedidos, filtrar_periodo, ler_base, ler_lotes, pedidos_retroativos, posicoes_periodo, preparar_dados,
+)
+from indice_marketplace import IndiceLocal, montar_indice
+from particoes_marketplace import carregar_particoes
+from perfil_marketplace import medir
+from sql_marketplace import ARQUIVO_BANCO, CuboSQL, IndiceSQL, PedidosSQL, abrir_banco, incorporar_lotes, ler_fonte, lotes_gravados
+
+# --- CONFIGURAÇÃO DA ATUALIZAÇÃO INCREMENTAL ---
+# Publicação de um lote: grave o arquivo com outro nome na mesma pasta (ex.: lote.csv.tmp) e
+# renomeie-o para .csv/.parquet só depois de fechado; a renomeação é atômica, então o app
+# nunca vê o arquivo pela metade. Só entram nomes terminados em EXTENSOES_LOTE, e, por
+# garantia contra cópias feitas direto com o nome final, só arquivos sem alteração há
+# IDADE_MINIMA_LOTE segundos (os mais recentes ficam para a verificação seguinte).
+PASTA_NOVOS_PEDIDOS = "novos_pedidos"
+EXTENSOES_LOTE = (".csv", ".parquet")
+IDADE_MINIMA_LOTE = float(os.environ.get("MARKETPLACE_IDADE_MINIMA_LOTE", "10"))
+INTERVALO_VERIFICACAO = 60  # segundos entre duas olhadas na pasta de novos pedidos
+# "memoria" (padrão) carrega a base inteira; "particionado" lê do disco, mês a mês, só o que cada período pede;
+# "sql" consulta um banco SQLite local que várias réplicas do app podem compartilhar;
+# "compartilhado" mapeia, sem cópia, a base que o processo de compartilhado_marketplace.py publica.
+MODO_DADOS = os.environ.get("MARKETPLACE_MODO_DADOS", "memoria")
+
+
+@dataclass(frozen=True)
+class PedidosMemoria:
+    """Pedidos em um único DataFrame na memória, ordenado pela data da compra.
+
+    Mesma interface de PedidosParticionados: as páginas pedem um período, um
+    intervalo ou um conjunto de posições e não precisam saber onde as linhas estão.
+    """
+    df: pd.DataFrame
+
+    def __len__(self):
+        return len(self.df)
+
+    def posicoes_periodo(self, data_inicio, data_fim):
+        return posicoes_periodo(self.df, data_inicio, data_fim)
+
+    def periodo(self, data_inicio, data_fim, colunas=None):
+        fatia = filtrar_periodo(self.df, data_inicio, data_fim)
+        return fatia if colunas is None else fatia[list(colunas)]
+
+    def linhas(self, posicoes, colunas):
+        return self.df[list(colunas)].take(posicoes)
+
+    def montar_indice(self):
+        return montar_indice(self.df)
+
+    def anexar(self, novos, numero):
+        """Incorpora pedidos já preparados. Devolve (pedidos novos, lote alinhado, se houve retroativos)."""
+        retroativos = pedidos_retroativos(self.df, novos)
+        df, novos = anexar_pedidos(self.df, novos)
+        return PedidosMemoria(df), novos, retroativos
+
+
+def carregar_memoria():
+    with medir("dados/ler_base"):
+        df = ler_base()
+    with medir("dados/preparar"):
+        df = preparar_dados(df)
+    with medir("dados/cubo"):
+        cubo = montar_cubo(df)
+    with medir("dados/indice"):
+        indice = montar_indice(df)
+    return PedidosMemoria(df), cubo, indice
+
+
+@dataclass(frozen=True)
+class VersaoDados:
+    """Uma versão completa e imutável da base: pedidos, cubo, índice por local e lotes já incorporados."""
+    numero: int
+    pedidos: object  # PedidosMemoria ou PedidosParticionados, conforme MODO_DADOS
+    cubo: CuboVendas
+    indice: IndiceLocal
+    lotes: frozenset
+
+
+class BaseMarketplace:
+    """Mantém a versão atual da base e incorpora lotes novos sem recarregar tudo.
+
+    Cada atualização monta uma VersaoDados nova ao lado da atual e só então
+    troca a referência, então quem já pegou uma versão continua lendo dados
+    consistentes até o fim do seu rerun.
+    """
+
+    def __init__(self, pasta=PASTA_NOVOS_PEDIDOS, modo=MODO_DADOS):
+        self.pasta = pasta
+        self._trava = threading.Lock()
+        self._ultima_verificacao = 0.0
+        self._rejeitados = set()  # lotes inválidos que não puderam ser movidos para a pasta de rejeitados
+        with medir("dados/carregar"):
+            pedidos, cubo, indice = carregar_particoes() if modo == "particionado" else carregar_memoria()
+        self._atual = VersaoDados(numero=0, pedidos=pedidos, cubo=cubo, indice=indice, lotes=frozenset())
+        self.atualizar()
+
+    def atual(self):
+        return self._atual
+
+    def lotes_pendentes(self):
+        """Lotes publicados e ainda não incorporados (ver a regra de publicação em PASTA_NOVOS_PEDIDOS)."""
+        if not os.path.isdir(self.pasta):
+            return []
+        limite = time.time() - IDADE_MINIMA_LOTE
+        pendentes = []
+        for entrada in os.scandir(self.pasta):
+            nome = entrada.name
+            if not nome.endswith(EXTENSOES_LOTE) or nome.startswith(".") or nome in self._atual.lotes or nome in self._rejeitados:
+                continue
+            try:
+                if entrada.is_file() and entrada.stat().st_mtime <= limite:
+                    pendentes.append(nome)
+            except FileNotFoundError:
+                pass  # renomeado ou removido entre a listagem e o stat
+        return sorted(pendentes)
+
+    def atualizar(self):
+        """Incorpora os lotes ainda não lidos da pasta de novos pedidos."""
+        if not self._trava.acquire(blocking=False):
+            return self._atual  # outra sessão já está atualizando
+        try:
+            self._ultima_verificacao = time.monotonic()
+            lotes = self.lotes_pendentes()
+            if not lotes:
+                return self._atual
+            with medir("dados/incorporar_lotes"):
+                atual = self._atual
+                novos, lotes, rejeitados = ler_lotes(self.pasta, lotes)
+                self._rejeitados.update(rejeitados)
+                if not lotes:
+                    return self._atual
+                pedidos, cubo, indice = atual.pedidos, atual.cubo, atual.indice
+                if len(novos):
+                    pedidos, novos, retroativos = pedidos.anexar(novos, atual.numero + 1)
+                    cubo = cubo.anexar(montar_cubo(novos))
+                    # Lote no fim da base: as posições antigas continuam valendo e só as novas entram no índice.
+                    # O índice particionado é gravado com os meses do lote, e montar_indice só relê as cidades.
+                    if retroativos or not hasattr(indice, "anexar"):
+                        indice = pedidos.montar_indice()
+                    else:
+                        indice = indice.anexar(montar_indice(novos, deslocamento=len(atual.pedidos)))
+                self._atual = VersaoDados(numero=atual.numero + 1, pedidos=pedidos, cubo=cubo, indice=indice, lotes=atual.lotes | set(lotes))
+            return self._atual
+        finally:
+            self._trava.release()
+
+    def verificar(self):
+        """Devolve a versão atual e, de tempos em tempos, procura lotes novos em segundo plano."""
+        if time.monotonic() - self._ultima_verificacao >= INTERVALO_VERIFICACAO:
+            self._ultima_verificacao = time.monotonic()
+            threading.Thread(target=self.atualizar, daemon=True).start()
+        return self._atual
+
+
+class BaseSQL(BaseMarketplace):
+    """Mesma interface da BaseMarketplace, com os pedidos e agregados consultados no banco SQLite.
+
+    Nenhum DataFrame da base fica na memória: cada versão é só um ponteiro para
+    a tabela do banco e o número de linhas válidas. Os lotes novos são gravados
+    no banco (uma vez só, mesmo com várias réplicas) e cada réplica publica a
+    versão nova quando vê que o banco mudou.
+    """
+
+    def __init__(self, pasta=PASTA_NOVOS_PEDIDOS, caminho_banco=ARQUIVO_BANCO):
+        self.pasta = pasta
+        self.caminho_banco = caminho_banco
+        self._trava = threading.Lock()
+        self._ultima_verificacao = 0.0
+        self._rejeitados = set()
+        with medir("dados/abrir_banco"):
+            abrir_banco(caminho_banco=caminho_banco)
+            self._atual = self.versao(0)
+        self.atualizar()
+
+    def versao(self, numero):
+        fonte = ler_fonte(self.caminho_banco)
+        return VersaoDados(
+            numero=numero, pedidos=PedidosSQL(fonte), cubo=CuboSQL(fonte), indice=IndiceSQL(fonte),
+            lotes=lotes_gravados(self.caminho_banco),
+        )
+
+    def atualizar(self):
+        """Grava os lotes pendentes no banco e publica uma versão nova se o banco mudou."""
+        if not self._trava.acquire(blocking=False):
+            return self._atual
+        try:
+            self._ultima_verificacao = time.monotonic()
+            self._rejeitados.update(incorporar_lotes(self.caminho_banco, self.pasta, self.lotes_pendentes()))
+            if ler_fonte(self.caminho_banco) != self._atual.pedidos.fonte:
+                self._atual = self.versao(self._atual.numero + 1)
+            return self._atual
+        finally:
+            self._trava.release()
+
+
+class BaseCompartilhada(BaseMarketplace):
+    """Versões publicadas pelo processo carregador, mapeadas em memória sem cópia.
+
+    Vários processos do Streamlit enxergam as mesmas páginas de memória, então
+    a base ocupa a RAM uma vez só. Este processo não lê o CSV nem incorpora
+    lotes: só troca para a versão nova quando o carregador publica uma.
+    """
+
+    def __init__(self, pasta_compartilhada=PASTA_COMPARTILHADA):
+        self.pasta_compartilhada = pasta_compartilhada
+        self._trava = threading.Lock()
+        self._ultima_verificacao = 0.0
+        with medir("dados/abrir_versao"):
+            self._atual = self.versao()
+
+    def versao(self):
+        numero, df, cubo, indice, lotes = abrir_versao(self.pasta_compartilhada)
+        return VersaoDados(numero=numero, pedidos=PedidosMemoria(df), cubo=cubo, indice=indice, lotes=lotes)
+
+    def atualizar(self):
+        if not self._trava.acquire(blocking=False):
+            return self._atual
+        try:
+            self._ultima_verificacao = time.monotonic()
+            publicada = versao_publicada(self.pasta_compartilhada)
+            if publicada is not None and publicada["numero"] != self._atual.numero:
+                self._atual = self.versao()
+            return self._atual
+        finally:
+            self._trava.release()
+
+
+@st.cache_resource(show_spinner="Carregando dados do marketplace...")
+def carregar_base():
+    """Carrega a base uma única vez por processo.
+
+    Os DataFrames de cada versão são compartilhados por todas as sessões e
+    páginas (st.cache_resource não copia o objeto a cada rerun), então devem
+    ser tratados como somente leitura: filtre e agregue, mas nunca altere.
+    """
+    if MODO_DADOS == "sql":
+        return BaseSQL()
+    if MODO_DADOS == "compartilhado":
+        return BaseCompartilhada()
+    return BaseMarketplace()
+
+
+def versao_atual():
+    # Cada rerun deve pegar a versão uma vez só e usá-la do começo ao fim.
+    with medir("dados/versao_atual"):
+        return carregar_base().verificar()
@@ -0,0 +1,126 @@
+# Gera um CSV sintético no esquema de dataset_olist_final_limpo.csv para os benchmarks:
+#   python benchmarks/gerar_dados.py --linhas 1000000 --saida /tmp/olist_1m.csv
+# As cardinalidades e distribuições seguem a base pública da Olist (estados,
+# ~4 mil cidades, ~3 mil lojas com cauda longa, 71 categorias, notas
+# concentradas em 5), e o volume de pedidos cresce ao longo do período.
+import argparse
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+
+# --- DISTRIBUIÇÕES DA BASE OLIST ---
+PESO_ESTADOS = {
+    "SP": 0.420, "RJ": 0.129, "MG": 0.117, "RS": 0.055, "PR": 0.051, "SC": 0.037, "BA": 0.034,
+    "DF": 0.021, "ES": 0.020, "GO": 0.020, "PE": 0.017, "CE": 0.013, "PA": 0.010, "MT": 0.009,
+    "MA": 0.0075, "MS": 0.0072, "PB": 0.0054, "PI": 0.0050, "RN": 0.0049, "AL": 0.0042,
+    "SE": 0.0035, "TO": 0.0028, "RO": 0.0025, "AM": 0.0015, "AC": 0.0008, "AP": 0.0007, "RR": 0.0005,
+}
+# Dias a mais na entrega para estados longe dos centros de distribuição do Sudeste.
+ATRASO_REGIONAL = {
+    "AC": 8, "AP": 10, "AM": 9, "PA": 8, "RO": 6, "RR": 11, "TO": 5,
+    "AL": 7, "BA": 5, "CE": 7, "MA": 7, "PB": 7, "PE": 6, "PI": 6, "RN": 7, "SE": 7,
+}
+TOTAL_CIDADES = 4119
+LOJAS_POR_100K = 3095
+CATEGORIAS = 71
+PCT_SEM_CATEGORIA = 0.014
+PCT_NAO_ENTREGUE = 0.03
+NOTAS = ([1.0, 2.0, 3.0, 4.0, 5.0, np.nan], [0.114, 0.032, 0.082, 0.191, 0.573, 0.008])
+INICIO, FIM = pd.Timestamp("2016-09-04"), pd.Timestamp("2018-10-17")
+LINHAS_POR_BLOCO = 500_000
+
+
+def ids_hex(rng, n):
+    """n identificadores hexadecimais de 32 caracteres, como os da Olist."""
+    bytes_ = rng.integers(0, 256, size=(n, 16), dtype=np.uint8)
+    digitos = np.stack([bytes_ >> 4, bytes_ & 15], axis=-1).reshape(n, 32)
+    return np.frombuffer(b"0123456789abcdef", dtype="S1")[digitos].view("S32").ravel().astype(str)
+
+
+def pesos_zipf(n, expoente=1.0):
+    pesos = 1.0 / np.arange(1, n + 1) ** expoente
+    return pesos / pesos.sum()
+
+
+def montar_catalogo(linhas, semente):
+    """Estados, cidades, lojas e categorias com as cardinalidades da escala pedida."""
+    rng = np.random.default_rng([semente, 0])
+    estados = np.array(list(PESO_ESTADOS))
+    peso_estados = np.array(list(PESO_ESTADOS.values()))
+    peso_estados /= peso_estados.sum()
+    # Estados maiores têm mais cidades, mas menos que proporcionalmente.
+    cidades_por_estado = np.maximum(5, np.round(TOTAL_CIDADES * peso_estados ** 0.6 / (peso_estados ** 0.6).sum())).astype(int)
+    cidades = {
+        estado: np.array([f"{estado.lower()}_cidade_{k}" for k in range(quantidade)])
+        for estado, quantidade in zip(estados, cidades_por_estado)
+    }
+    n_lojas = max(50, int(LOJAS_POR_100K * np.sqrt(linhas / 100_000)))
+    return {
+        "estados": estados,
+        "peso_estados": peso_estados,
+        "cidades": cidades,
+        "lojas": ids_hex(rng, n_lojas),
+        "categorias": np.array([f"categoria_{k:02d}" for k in range(CATEGORIAS)], dtype=object),
+    }
+
+
+def gerar_bloco(catalogo, n, rng):
+    # Crescimento linear do volume: a densidade das datas sobe ao longo do período.
+    fracao = np.sqrt(rng.random(n))
+    compra = INICIO + pd.to_timedelta(fracao * (FIM - INICIO).total_seconds(), unit="s")
+    compra = pd.DatetimeIndex(compra).floor("s")
+
+    estado = rng.choice(catalogo["estados"], size=n, p=catalogo["peso_estados"])
+    cidade = np.empty(n, dtype=object)
+    for uf, nomes in catalogo["cidades"].items():
+        linhas = np.flatnonzero(estado == uf)
+        cidade[linhas] = nomes[rng.choice(len(nomes), size=len(linhas), p=pesos_zipf(len(nomes)))]
+
+    lojas = catalogo["lojas"]
+    loja = lojas[rng.choice(len(lojas), size=n, p=pesos_zipf(len(lojas), 0.6))]
+    categoria = catalogo["categorias"][rng.choice(CATEGORIAS, size=n, p=pesos_zipf(CATEGORIAS, 0.8))]
+    categoria[rng.random(n) < PCT_SEM_CATEGORIA] = None
+
+    atraso_regional = pd.Series(estado).map(ATRASO_REGIONAL).fillna(0).to_numpy()
+    dias_entrega = rng.gamma(2.2, 4.5, n) + atraso_regional
+    entrega = pd.Series(compra + pd.to_timedelta(dias_entrega * 86400, unit="s")).dt.floor("s")
+    entrega[rng.random(n) < PCT_NAO_ENTREGUE] = pd.NaT
+    estimada = (compra + pd.to_timedelta(rng.integers(10, 35, n), unit="D")).normalize()
+
+    return pd.DataFrame({
+        "order_id": ids_hex(rng, n),
+        "customer_id": ids_hex(rng, n),
+        "seller_id": loja,
+        "customer_city": cidade,
+        "customer_state": estado,
+        "product_category_name_english": categoria,
+        "payment_value": np.round(rng.gamma(1.6, 100, n) + 10, 2),
+        "freight_value": np.round(rng.gamma(2.5, 8, n) + 0.5 * atraso_regional, 2),
+        "review_score": rng.choice(NOTAS[0], size=n, p=NOTAS[1]),
+        "order_purchase_timestamp": compra,
+        "order_delivered_customer_date": entrega.to_numpy(),
+        "order_estimated_delivery_date": estimada,
+    })
+
+
+def gerar_csv(linhas, caminho, semente=0):
+    """Grava `linhas` pedidos em `caminho`, em blocos para não montar tudo na memória."""
+    catalogo = montar_catalogo(linhas, semente)
+    temporario = caminho + ".tmp"
+    for numero, inicio in enumerate(range(0, linhas, LINHAS_POR_BLOCO)):
+        rng = np.random.default_rng([semente, numero + 1])
+        bloco = gerar_bloco(catalogo, min(LINHAS_POR_BLOCO, linhas - inicio), rng)
+        bloco.to_csv(temporario, mode="w" if numero == 0 else "a", header=numero == 0, index=False)
+    os.replace(temporario, caminho)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Gera um dataset sintético no esquema da Olist.")
+    parser.add_argument("--linhas", type=int, default=100_000, help="número de pedidos (ex.: 100000, 1000000, 10000000)")
+    parser.add_argument("--saida", default="dataset_olist_final_limpo.csv")
+    parser.add_argument("--semente", type=int, default=0)
+    args = parser.parse_args()
+    gerar_csv(args.linhas, args.saida, args.semente)
+    print(f"{args.linhas:,} pedidos gravados em {args.saida}", file=sys.stderr)
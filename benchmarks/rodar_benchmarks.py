@@ -0,0 +1,323 @@
+# Mede, sem navegador, os caminhos quentes do app e grava latência e pico de memória em JSON
+# (heap do Python pelo tracemalloc, RSS do processo e bytes alocados pelo Arrow):
+#   python benchmarks/gerar_dados.py --linhas 1000000 --saida /tmp/olist_1m.csv
+#   python benchmarks/rodar_benchmarks.py --dados /tmp/olist_1m.csv --saida baseline_1m.json
+#   python benchmarks/rodar_benchmarks.py --dados /tmp/olist_1m.csv --comparar baseline_1m.json
+# Com --comparar, sai com código 1 se algum benchmark ficou mais lento ou usou
+# mais memória que a baseline além da tolerância. As consultas do bot, das abas
+# e da seleção da logística rodam também no backend SQL (prefixo sql/).
+import argparse
+import ctypes
+import ctypes.util
+import gc
+import json
+import logging
+import os
+import platform
+import resource
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+import warnings
+from dataclasses import dataclass
+from datetime import timedelta
+
+logging.disable(logging.WARNING)  # sem o servidor, o Streamlit avisa a cada chamada de cache e de página
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, RAIZ)
+# O aquecimento em segundo plano disputaria a CPU com o que está sendo medido.
+os.environ.setdefault("MARKETPLACE_THREADS_AQUECIMENTO", "0")
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import streamlit as st
+from streamlit.testing.v1 import AppTest
+
+from analise_marketplace import gerar_resposta_analitica
+from base_marketplace import BaseMarketplace, BaseSQL, carregar_base
+from dados_marketplace import ARQUIVO_CSV, ARQUIVO_SNAPSHOT, dividir_periodo, filtrar_periodo, ler_base
+from graficos_marketplace import carregar_cache_figuras
+from indice_marketplace import estados_das_regioes
+from planos_marketplace import PLANOS, resultados_aba
+from resultados_marketplace import carregar_cache_resultados
+from sql_marketplace import consultar_banco, gerar_banco
+
+# --- CONFIGURAÇÃO DOS BENCHMARKS ---
+REPETICOES = 5
+REPETICOES_CARGA = 2
+TOLERANCIA = 0.25  # 25% acima da baseline conta como regressão
+FOLGA_MS = 2.0  # diferenças menores que isso são ruído, não regressão
+FOLGA_RSS_MB = 8.0  # o RSS oscila com o alocador e as páginas do sistema: abaixo disso é ruído
+LIBC = ctypes.CDLL(ctypes.util.find_library("c")) if ctypes.util.find_library("c") else None
+PERGUNTAS_BOT = {
+    "concentracao": "Qual a concentração de vendas?",
+    "desempenho": "Como está o desempenho dos vendedores?",
+    "atrasos": "Atrasos afetam avaliações?",
+    "loja_top": "Qual a loja com mais pedidos?",
+    "nao_entendi": "Qual a previsão do tempo?",
+}
+NOMES_ABAS = {"Visão Geral": "visao_geral", "Análise de Lojas": "lojas", "Análise de Logística": "logistica"}
+COLUNAS_LOGISTICA = ["order_purchase_timestamp", "customer_state", "customer_city", "tempo_entrega", "freight_value", "atraso"]
+
+
+@dataclass(frozen=True)
+class Benchmark:
+    nome: str
+    funcao: object
+    preparar: object = None  # roda antes de cada repetição, fora da medição (ex.: limpar caches)
+    repeticoes: int = REPETICOES
+
+
+def limpar_caches():
+    carregar_cache_resultados().limpar()
+    carregar_cache_figuras.clear()
+    consultar_banco.clear()
+
+
+def apagar_snapshot():
+    if os.path.exists(ARQUIVO_SNAPSHOT):
+        os.remove(ARQUIVO_SNAPSHOT)
+
+
+def memoria_processo():
+    """(RSS atual, pico de RSS) do processo, em bytes."""
+    try:
+        with open("/proc/self/status") as arquivo:
+            campos = {linha.split(":")[0]: int(linha.split()[1]) * 1024 for linha in arquivo if linha.startswith(("VmRSS", "VmHWM"))}
+        return campos["VmRSS"], campos["VmHWM"]
+    except (OSError, KeyError):
+        # Sem /proc: só o pico desde o início do processo (KB no Linux, bytes no macOS).
+        pico = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * (1 if sys.platform == "darwin" else 1024)
+        return pico, pico
+
+
+def zerar_pico_rss():
+    # Devolve ao sistema o que o malloc guardou de execuções anteriores; sem isso a próxima
+    # reaproveita páginas já residentes e o RSS quase não sobe.
+    gc.collect()
+    if LIBC is not None and hasattr(LIBC, "malloc_trim"):
+        LIBC.malloc_trim(0)
+    # No Linux, escrever 5 em clear_refs faz o pico (VmHWM) voltar ao RSS atual.
+    try:
+        with open("/proc/self/clear_refs", "w") as arquivo:
+            arquivo.write("5")
+    except OSError:
+        pass  # sem o reset, o pico medido só conta quando passa do maior pico anterior
+
+
+def medir_rss(benchmark):
+    """Quanto o RSS subiu no pico de uma execução e quantos bytes do Arrow ela deixou alocados.
+
+    O tracemalloc só vê o heap do Python; o RSS inclui também os buffers do
+    pyarrow, os arquivos mapeados em memória (snapshot, partições, modo
+    compartilhado) e o que as extensões em C alocam por conta própria.
+    """
+    if benchmark.preparar:
+        benchmark.preparar()
+    zerar_pico_rss()
+    rss, _ = memoria_processo()
+    arrow = pa.total_allocated_bytes()
+    benchmark.funcao()
+    _, pico = memoria_processo()
+    return max(0, pico - rss), pa.total_allocated_bytes() - arrow
+
+
+def medir(benchmark):
+    # O RSS sai primeiro, antes que as repetições deixem memória livre e já residente no processo.
+    pico_rss, arrow = medir_rss(benchmark)
+    tempos = []
+    for _ in range(benchmark.repeticoes):
+        if benchmark.preparar:
+            benchmark.preparar()
+        inicio = time.perf_counter()
+        benchmark.funcao()
+        tempos.append(1e3 * (time.perf_counter() - inicio))
+    # O tracemalloc deixa tudo mais lento, então o pico do heap do Python sai de uma execução à parte.
+    if benchmark.preparar:
+        benchmark.preparar()
+    tracemalloc.start()
+    benchmark.funcao()
+    _, pico = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return {
+        "mediana_ms": round(float(np.median(tempos)), 3),
+        "min_ms": round(min(tempos), 3),
+        "max_ms": round(max(tempos), 3),
+        "repeticoes": benchmark.repeticoes,
+        "pico_mb": round(pico / 2**20, 2),
+        "pico_rss_mb": round(pico_rss / 2**20, 2),
+        "arrow_mb": round(arrow / 2**20, 2),
+    }
+
+
+def periodos(df):
+    fim = df["order_purchase_timestamp"].iloc[-1].date()
+    return {
+        "completo": (df["order_purchase_timestamp"].iloc[0].date(), fim),
+        "ano": (fim - timedelta(days=364), fim),
+        "mes": (fim - timedelta(days=29), fim),
+    }
+
+
+def rodar_pagina(arquivo, periodo, ajustar=None):
+    def rodar():
+        app = AppTest.from_file(os.path.join(RAIZ, arquivo), default_timeout=600)
+        app.session_state["date_range"] = periodo
+        app.run()
+        if ajustar:
+            ajustar(app)
+        if app.exception:
+            raise RuntimeError(f"{arquivo}: {app.exception[0].value}")
+    return rodar
+
+
+def selecionar_regiao(versao, inicio, fim):
+    # O que a página de logística faz para montar os pedidos do N/NE no período.
+    def selecionar():
+        posicoes = versao.indice.posicoes(estados_das_regioes(("Norte", "Nordeste")), (), *versao.pedidos.posicoes_periodo(inicio, fim))
+        return versao.pedidos.linhas(posicoes, COLUNAS_LOGISTICA)
+    return selecionar
+
+
+def benchmarks_consultas(versao, ano, prefixo=""):
+    """Bot, abas do dashboard e seleção da logística sobre uma versão (em memória ou SQL)."""
+    benchmarks = []
+    for nome, pergunta in PERGUNTAS_BOT.items():
+        responder = lambda p=pergunta: gerar_resposta_analitica(p, versao, *ano)
+        benchmarks.append(Benchmark(f"{prefixo}bot/{nome}", responder, preparar=limpar_caches))
+        benchmarks.append(Benchmark(f"{prefixo}bot/{nome}/memoizado", responder))
+
+    for aba in PLANOS:
+        benchmarks.append(Benchmark(f"{prefixo}dashboard/{NOMES_ABAS[aba]}", lambda a=aba: resultados_aba(a, versao, *ano), preparar=limpar_caches))
+    benchmarks.append(Benchmark(
+        f"{prefixo}dashboard/visao_geral_clientes_exatos",
+        lambda: resultados_aba("Visão Geral", versao, *ano, clientes_exatos=True), preparar=limpar_caches,
+    ))
+    benchmarks.append(Benchmark(f"{prefixo}logistica/selecao_ano", selecionar_regiao(versao, *ano), preparar=limpar_caches))
+    return benchmarks
+
+
+def montar_benchmarks(versao, versao_sql):
+    datas = periodos(versao.pedidos.df)
+    ano = datas["ano"]
+    benchmarks = [
+        Benchmark("carregar_dados/csv", BaseMarketplace, preparar=apagar_snapshot, repeticoes=REPETICOES_CARGA),
+        Benchmark("carregar_dados/snapshot", BaseMarketplace, repeticoes=REPETICOES_CARGA),
+        Benchmark("carregar_dados/ler_snapshot", ler_base),
+    ]
+    for nome, (inicio, fim) in datas.items():
+        benchmarks.append(Benchmark(f"filtros/periodo_{nome}", lambda i=inicio, f=fim: filtrar_periodo(versao.pedidos.df, i, f)))
+    benchmarks.append(Benchmark("filtros/dividir_periodo", lambda: dividir_periodo(versao.pedidos.df, ano[0])))
+
+    benchmarks += benchmarks_consultas(versao, ano)
+    benchmarks.append(Benchmark("carregar_dados/sql_gerar_banco", gerar_banco, repeticoes=1))
+    benchmarks += benchmarks_consultas(versao_sql, ano, prefixo="sql/")
+
+    for nome, (inicio, fim) in datas.items():
+        benchmarks.append(Benchmark(
+            f"paginas/logistica_{nome}", rodar_pagina("pages/logistica_regional_marketplace.py", (inicio, fim)),
+            preparar=limpar_caches, repeticoes=3,
+        ))
+    cidades = lambda app: app.multiselect[0].set_value(app.multiselect[0].options[:3]).run()
+    benchmarks.append(Benchmark(
+        "paginas/logistica_ano_3_cidades", rodar_pagina("pages/logistica_regional_marketplace.py", ano, cidades),
+        preparar=limpar_caches, repeticoes=3,
+    ))
+    benchmarks.append(Benchmark(
+        "paginas/dashboard_ano", rodar_pagina("pages/dashboard_marketplace.py", ano), preparar=limpar_caches, repeticoes=3,
+    ))
+    return benchmarks
+
+
+def ambiente(linhas):
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=RAIZ, capture_output=True, text=True).stdout.strip()
+    except OSError:
+        commit = ""
+    return {
+        "linhas": linhas,
+        "commit": commit,
+        "python": platform.python_version(),
+        "pandas": pd.__version__,
+        "numpy": np.__version__,
+        "streamlit": st.__version__,
+        "plataforma": platform.platform(),
+        "cpus": os.cpu_count(),
+    }
+
+
+def comparar(resultados, baseline, tolerancia=TOLERANCIA):
+    """Lista de regressões (nome, métrica, baseline, atual) em relação à baseline."""
+    regressoes = []
+    for nome, atual in resultados.items():
+        anterior = baseline.get(nome)
+        if anterior is None:
+            continue
+        if atual["mediana_ms"] > anterior["mediana_ms"] * (1 + tolerancia) and atual["mediana_ms"] - anterior["mediana_ms"] > FOLGA_MS:
+            regressoes.append((nome, "mediana_ms", anterior["mediana_ms"], atual["mediana_ms"]))
+        if atual["pico_mb"] > anterior["pico_mb"] * (1 + tolerancia) and atual["pico_mb"] - anterior["pico_mb"] > 1:
+            regressoes.append((nome, "pico_mb", anterior["pico_mb"], atual["pico_mb"]))
+        for metrica in ("pico_rss_mb", "arrow_mb"):
+            if metrica not in anterior:
+                continue  # baseline gravada antes desta métrica existir
+            if atual[metrica] > anterior[metrica] * (1 + tolerancia) and atual[metrica] - anterior[metrica] > FOLGA_RSS_MB:
+                regressoes.append((nome, metrica, anterior[metrica], atual[metrica]))
+    return regressoes
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmarks dos caminhos quentes do marketplace.")
+    parser.add_argument("--dados", required=True, help="CSV no esquema da Olist (veja benchmarks/gerar_dados.py)")
+    parser.add_argument("--saida", help="grava os resultados neste JSON")
+    parser.add_argument("--comparar", help="JSON de baseline para detectar regressões")
+    parser.add_argument("--tolerancia", type=float, default=TOLERANCIA)
+    parser.add_argument("--filtro", default="", help="roda só os benchmarks cujo nome contém este texto")
+    args = parser.parse_args()
+    warnings.filterwarnings("ignore", message="Converting to PeriodArray")
+
+    dados = os.path.abspath(args.dados)
+    saida = os.path.abspath(args.saida) if args.saida else None
+    comparacao = os.path.abspath(args.comparar) if args.comparar else None
+    pasta = tempfile.mkdtemp(prefix="benchmarks_marketplace_")
+    try:
+        # O app lê o CSV e grava o snapshot no diretório atual; cada rodada usa uma pasta limpa.
+        os.symlink(dados, os.path.join(pasta, ARQUIVO_CSV))
+        os.chdir(pasta)
+        # Mesma instância que as páginas pegam via st.cache_resource: as páginas medem só o rerun.
+        versao = carregar_base().atual()
+        versao_sql = BaseSQL().atual()
+        resultados = {}
+        for benchmark in montar_benchmarks(versao, versao_sql):
+            if args.filtro not in benchmark.nome:
+                continue
+            resultados[benchmark.nome] = medir(benchmark)
+            r = resultados[benchmark.nome]
+            print(
+                f"{benchmark.nome:<45} {r['mediana_ms']:>10.2f} ms  (min {r['min_ms']:.2f})  pico {r['pico_mb']:>8.2f} MB"
+                f"  RSS {r['pico_rss_mb']:>8.2f} MB  Arrow {r['arrow_mb']:>7.2f} MB",
+                file=sys.stderr,
+            )
+        relatorio = {"ambiente": ambiente(len(versao.pedidos)), "resultados": resultados}
+    finally:
+        os.chdir(RAIZ)
+        shutil.rmtree(pasta, ignore_errors=True)
+
+    if saida:
+        with open(saida, "w", encoding="utf-8") as arquivo:
+            json.dump(relatorio, arquivo, indent=2, ensure_ascii=False)
+    if comparacao:
+        with open(comparacao, encoding="utf-8") as arquivo:
+            baseline = json.load(arquivo)
+        regressoes = comparar(resultados, baseline["resultados"], args.tolerancia)
+        for nome, metrica, anterior, atual in regressoes:
+            print(f"REGRESSÃO {nome} {metrica}: {anterior} -> {atual}", file=sys.stderr)
+        if regressoes:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
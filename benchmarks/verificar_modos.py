@@ -0,0 +1,218 @@
+# Verifica, sem navegador, que os quatro modos de dados respondem igual:
+#   python benchmarks/verificar_modos.py --linhas 50000
+#   python benchmarks/verificar_modos.py --dados /tmp/olist_1m.csv
+# A base em memória é a referência; contra ela são comparadas a particionada, a
+# do SQLite (duas réplicas no mesmo banco) e a compartilhada (publicada como o
+# carregador faz e mapeada como as páginas fazem). Compara períodos, agregados
+# de todas as abas, tabela de lojas, respostas do bot e índice por local, antes
+# e depois de um lote no fim da base, de um lote retroativo e de um lote
+# inválido, que todos devem rejeitar. Sai com código 1 se algum modo divergir.
+import argparse
+import logging
+import math
+import os
+import shutil
+import sys
+import tempfile
+import warnings
+from datetime import timedelta
+
+logging.disable(logging.WARNING)  # sem o servidor, o Streamlit avisa a cada chamada de cache
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, RAIZ)
+os.environ.setdefault("MARKETPLACE_THREADS_AQUECIMENTO", "0")
+os.environ["MARKETPLACE_IDADE_MINIMA_LOTE"] = "0"  # os lotes são gravados e lidos logo em seguida
+
+import numpy as np
+import pandas as pd
+
+from analise_marketplace import gerar_resposta_analitica, tabela_vendedores
+from base_marketplace import PASTA_NOVOS_PEDIDOS, BaseCompartilhada, BaseMarketplace, BaseSQL
+from compartilhado_marketplace import publicar
+from dados_marketplace import ARQUIVO_CSV, PASTA_REJEITADOS
+from gerar_dados import gerar_csv
+from planos_marketplace import PLANOS, executar_plano
+from rodar_benchmarks import COLUNAS_LOGISTICA, PERGUNTAS_BOT
+
+# --- CONFIGURAÇÃO DA VERIFICAÇÃO ---
+LINHAS_LOTE = 300
+TOLERANCIA = 1e-3  # o SQLite soma em outra ordem e guarda reais em 64 bits
+ESTADOS = ("BA", "PE", "SP")
+
+
+def conferir(x, y):
+    """Levanta AssertionError se `y` difere de `x` além do ruído de ponto flutuante."""
+    opcoes = dict(check_dtype=False, check_categorical=False, check_index_type=False, rtol=TOLERANCIA, atol=TOLERANCIA)
+    if isinstance(x, pd.DataFrame):
+        pd.testing.assert_frame_equal(x, y[list(x.columns)], check_column_type=False, **opcoes)
+    elif isinstance(x, pd.Series):
+        pd.testing.assert_series_equal(x, y, **opcoes)
+    elif isinstance(x, np.ndarray):
+        np.testing.assert_array_equal(x, y)
+    elif isinstance(x, dict):
+        assert x.keys() == y.keys(), (sorted(x), sorted(y))
+        for chave in x:
+            try:
+                conferir(x[chave], y[chave])
+            except AssertionError as erro:
+                raise AssertionError(f"[{chave}] {erro}") from None
+    elif isinstance(x, float) or isinstance(y, float):
+        assert (pd.isna(x) and pd.isna(y)) or math.isclose(x, y, rel_tol=TOLERANCIA, abs_tol=TOLERANCIA), (x, y)
+    else:
+        assert x == y, (x, y)
+
+
+def periodos(referencia, fim_original):
+    datas = referencia.pedidos.df["order_purchase_timestamp"]
+    inicio, fim = datas.iloc[0].date(), datas.iloc[-1].date()
+    meio = inicio + (fim - inicio) / 2
+    return {
+        "completo": (inicio, fim),
+        "ano": (fim - timedelta(days=364), fim),
+        "mes": (fim - timedelta(days=29), fim),
+        "trimestre_no_meio": (meio, meio + timedelta(days=90)),
+        "dias_no_meio": (meio, meio + timedelta(days=3)),
+        "depois_da_base_original": (fim_original + timedelta(days=1), fim_original + timedelta(days=5000)),
+        "antes_da_base": (inicio - timedelta(days=400), inicio - timedelta(days=1)),
+    }
+
+
+def verificacoes(referencia, outra, datas, cidades):
+    """(nome, função que devolve (valor da referência, valor do outro modo)) de tudo o que é comparado."""
+    yield "linhas", lambda: (len(referencia.pedidos), len(outra.pedidos))
+    yield "lotes", lambda: (sorted(referencia.lotes), sorted(outra.lotes))
+    yield "periodo_completo", lambda: (referencia.cubo.periodo_completo(), outra.cubo.periodo_completo())
+    yield "cidades_da_regiao", lambda: (referencia.indice.cidades_da_regiao(ESTADOS), outra.indice.cidades_da_regiao(ESTADOS))
+    for filtro in [(), cidades]:
+        for intervalo in [(0, None), (len(referencia.pedidos) // 10, len(referencia.pedidos) // 2)]:
+            nome = f"indice{'/cidades' if filtro else ''}/{intervalo}"
+            yield nome, lambda f=filtro, i=intervalo: (referencia.indice.posicoes(ESTADOS, f, *i), outra.indice.posicoes(ESTADOS, f, *i))
+            yield f"{nome}/linhas", lambda f=filtro, i=intervalo: (
+                referencia.pedidos.linhas(referencia.indice.posicoes(ESTADOS, f, *i), COLUNAS_LOGISTICA).reset_index(drop=True),
+                outra.pedidos.linhas(outra.indice.posicoes(ESTADOS, f, *i), COLUNAS_LOGISTICA).reset_index(drop=True),
+            )
+    # O cubo do SQL conta clientes distintos exatamente; os outros estimam, a menos que a contagem exata seja pedida.
+    opcoes_clientes = (True,) if outra.cubo.distintos_exatos else (False, True)
+    for nome, (inicio, fim) in datas.items():
+        yield f"{nome}/posicoes", lambda i=inicio, f=fim: (referencia.pedidos.posicoes_periodo(i, f), outra.pedidos.posicoes_periodo(i, f))
+        yield f"{nome}/pedidos", lambda i=inicio, f=fim: (
+            referencia.pedidos.periodo(i, f).reset_index(drop=True), outra.pedidos.periodo(i, f).reset_index(drop=True),
+        )
+        yield f"{nome}/vendedores", lambda i=inicio, f=fim: (tabela_vendedores(referencia, i, f), tabela_vendedores(outra, i, f))
+        for aba in PLANOS:
+            for exatos in opcoes_clientes:
+                yield f"{nome}/{aba}{' (clientes exatos)' if exatos else ''}", lambda a=aba, i=inicio, f=fim, e=exatos: (
+                    executar_plano(a, referencia, i, f, e), executar_plano(a, outra, i, f, e),
+                )
+        for chave, pergunta in PERGUNTAS_BOT.items():
+            yield f"{nome}/bot/{chave}", lambda p=pergunta, i=inicio, f=fim: (
+                gerar_resposta_analitica(p, referencia, i, f), gerar_resposta_analitica(p, outra, i, f),
+            )
+
+
+def comparar_modos(etapa, bases, fim_original):
+    """Compara cada modo com a referência em memória. Devolve a lista de divergências."""
+    referencia = bases["memoria"].atual()
+    datas = periodos(referencia, fim_original)
+    cidades = tuple(referencia.indice.cidades_da_regiao(ESTADOS)[:3]) + ("cidade_nova",)
+    divergencias = []
+    for modo, base in bases.items():
+        if modo == "memoria":
+            continue
+        outra = base.atual()
+        falhas = 0
+        for nome, calcular in verificacoes(referencia, outra, datas, cidades):
+            try:
+                conferir(*calcular())
+            except Exception as erro:  # um erro em um modo também é divergência: segue comparando o resto
+                falhas += 1
+                mensagem = str(erro).splitlines()[0][:300] if str(erro) else ""
+                divergencias.append((etapa, modo, nome, mensagem if isinstance(erro, AssertionError) else f"{type(erro).__name__}: {mensagem}"))
+        print(f"{etapa:<12} {modo:<14} {len(outra.pedidos):>10,} linhas  {'ok' if not falhas else f'{falhas} divergências'}", file=sys.stderr)
+    return divergencias
+
+
+def gravar_lote(pasta, nome, df):
+    # Publicação atômica, como o app espera: grava com outro nome e renomeia.
+    caminho = os.path.join(pasta, nome)
+    df.to_csv(caminho + ".tmp", index=False)
+    os.replace(caminho + ".tmp", caminho)
+
+
+def montar_lotes(dados, fim_original, inicio_original):
+    """Um lote depois do fim da base (lojas e cidades novas) e um retroativo (categoria nova)."""
+    amostra = pd.read_csv(dados, nrows=50 * LINHAS_LOTE)
+    anexado = amostra.sample(LINHAS_LOTE, random_state=1).reset_index(drop=True)
+    anexado["seller_id"] = anexado["seller_id"].where(anexado.index % 3 != 0, "loja_nova")
+    anexado["customer_city"] = anexado["customer_city"].where(anexado.index % 4 != 0, "cidade_nova")
+    deslocamento = pd.Timedelta(days=(fim_original - inicio_original).days + 30)
+    for coluna in ["order_purchase_timestamp", "order_delivered_customer_date", "order_estimated_delivery_date"]:
+        anexado[coluna] = pd.to_datetime(anexado[coluna]) + deslocamento
+    retroativo = amostra.sample(LINHAS_LOTE, random_state=2).reset_index(drop=True)
+    retroativo["product_category_name_english"] = retroativo["product_category_name_english"].where(retroativo.index % 5 != 0, "categoria_nova")
+    return anexado, retroativo
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Verifica que os modos memória, particionado, SQL e compartilhado dão os mesmos resultados.")
+    parser.add_argument("--dados", help="CSV no esquema da Olist; sem ele, gera um sintético com --linhas")
+    parser.add_argument("--linhas", type=int, default=50_000)
+    parser.add_argument("--semente", type=int, default=0)
+    args = parser.parse_args()
+    warnings.filterwarnings("ignore", message="Converting to PeriodArray")
+
+    pasta = tempfile.mkdtemp(prefix="verificar_modos_")
+    try:
+        dados = os.path.abspath(args.dados) if args.dados else os.path.join(pasta, "sintetico.csv")
+        if not args.dados:
+            gerar_csv(args.linhas, dados, args.semente)
+        os.symlink(dados, os.path.join(pasta, ARQUIVO_CSV))
+        os.chdir(pasta)
+        compartilhada = os.path.join(pasta, "compartilhado")
+        os.makedirs(compartilhada)
+
+        bases = {"memoria": BaseMarketplace(modo="memoria")}
+        # A referência faz o papel do carregador: é a versão dela que o modo compartilhado publica e mapeia.
+        publicar(bases["memoria"].atual(), 0, compartilhada)
+        bases["particionado"] = BaseMarketplace(modo="particionado")
+        bases["sql"] = BaseSQL()
+        bases["sql_replica"] = BaseSQL()
+        bases["compartilhado"] = BaseCompartilhada(compartilhada)
+
+        datas = bases["memoria"].atual().pedidos.df["order_purchase_timestamp"]
+        inicio_original, fim_original = datas.iloc[0].date(), datas.iloc[-1].date()
+        anexado, retroativo = montar_lotes(dados, fim_original, inicio_original)
+        os.makedirs(PASTA_NOVOS_PEDIDOS)
+        etapas = [
+            ("inicial", {}),
+            ("anexado", {"anexado.csv": anexado}),
+            ("retroativo", {"retroativo.csv": retroativo, "invalido.csv": pd.DataFrame({"a": [1], "b": [2]})}),
+        ]
+        divergencias = []
+        for etapa, lotes in etapas:
+            for nome, df in lotes.items():
+                gravar_lote(PASTA_NOVOS_PEDIDOS, nome, df)
+            for modo, base in bases.items():
+                if modo != "compartilhado":
+                    base.atualizar()
+            if bases["memoria"].atual().numero != bases["compartilhado"].atual().numero:
+                publicar(bases["memoria"].atual(), bases["memoria"].atual().numero, compartilhada)
+                bases["compartilhado"].atualizar()
+            divergencias += comparar_modos(etapa, bases, fim_original)
+        for modo, base in bases.items():
+            if "invalido.csv" in base.atual().lotes:
+                divergencias.append(("retroativo", modo, "lote inválido", "incorporado em vez de rejeitado"))
+        if not os.path.exists(os.path.join(PASTA_NOVOS_PEDIDOS, PASTA_REJEITADOS, "invalido.csv")):
+            divergencias.append(("retroativo", "-", "lote inválido", f"não foi movido para {PASTA_REJEITADOS}/"))
+    finally:
+        os.chdir(RAIZ)
+        shutil.rmtree(pasta, ignore_errors=True)
+
+    for etapa, modo, nome, erro in divergencias:
+        print(f"DIVERGÊNCIA {etapa} {modo} {nome}: {erro}", file=sys.stderr)
+    if divergencias:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
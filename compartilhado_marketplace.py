@@ -0,0 +1,184 @@
+# Modo multiprocesso: um processo carregador publica a base preparada (pedidos com
+# as colunas derivadas, cubo e índice) em arquivos mapeados em memória, e cada
+# processo do Streamlit só os mapeia, sem copiar os dados:
+#   python compartilhado_marketplace.py &
+#   MARKETPLACE_MODO_DADOS=compartilhado streamlit run botdash_marketplace.py --server.port 8501 &
+#   MARKETPLACE_MODO_DADOS=compartilhado streamlit run botdash_marketplace.py --server.port 8502 &
+# O carregador também incorpora os lotes de novos pedidos e publica cada versão nova.
+import json
+import os
+import shutil
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.feather as feather
+
+from cubo_marketplace import DIMENSOES, CuboVendas, ParcialDiaria
+from indice_marketplace import IndiceLocal
+
+# --- CONFIGURAÇÃO DO MODO COMPARTILHADO ---
+# /dev/shm fica na RAM: as páginas dos arquivos são as mesmas para todos os processos.
+PASTA_COMPARTILHADA = os.environ.get(
+    "MARKETPLACE_PASTA_COMPARTILHADA",
+    "/dev/shm/marketplace" if os.path.isdir("/dev/shm") else os.path.join(tempfile.gettempdir(), "marketplace"),
+)
+ARQUIVO_ATUAL = "atual.json"
+VERSOES_MANTIDAS = 2  # a publicada e a anterior, que algum processo ainda pode estar abrindo
+
+
+def salvar_frame(df, caminho):
+    """Grava o DataFrame em Arrow sem compressão, pronto para ser mapeado.
+
+    Nada que o pandas teria de converter ao ler vai para o arquivo: as
+    categóricas são gravadas como os seus códigos inteiros, com as categorias
+    ao lado (`<caminho>.categorias.json`); booleanos vão como uint8 (o Arrow
+    guarda bool em bits); e os NaN dos floats são valores, não nulos. Tudo
+    vai em um único lote de linhas: com vários, o pandas teria de
+    concatená-los ao ler.
+    """
+    categorias, booleanas, colunas = {}, [], {}
+    for coluna, serie in df.items():
+        if isinstance(serie.dtype, pd.CategoricalDtype):
+            categorias[coluna] = serie.cat.categories.tolist()
+            colunas[coluna] = pa.array(serie.cat.codes.to_numpy())
+        elif pd.api.types.is_bool_dtype(serie) and not isinstance(serie.dtype, pd.api.extensions.ExtensionDtype):
+            booleanas.append(coluna)
+            colunas[coluna] = pa.array(serie.to_numpy().view(np.uint8))
+        elif pd.api.types.is_float_dtype(serie) and not isinstance(serie.dtype, pd.api.extensions.ExtensionDtype):
+            colunas[coluna] = pa.array(serie.to_numpy(), from_pandas=False)
+        else:
+            colunas[coluna] = pa.Array.from_pandas(serie)
+    tabela = pa.table(colunas) if colunas else pa.Table.from_pandas(df, preserve_index=False)
+    feather.write_feather(tabela.combine_chunks(), caminho, compression="uncompressed", chunksize=max(len(df), 1))
+    with open(f"{caminho}.categorias.json", "w", encoding="utf-8") as arquivo:
+        json.dump({"categorias": categorias, "booleanas": booleanas}, arquivo, ensure_ascii=False)
+
+
+def ler_frame(caminho):
+    """DataFrame de salvar_frame com as colunas apontando para o arquivo mapeado, sem cópia.
+
+    As categóricas são remontadas com Categorical.from_codes sobre os códigos
+    mapeados e os booleanos são uma view dos bytes; só as listas de categorias
+    ficam no heap de cada processo.
+    """
+    # split_blocks evita juntar colunas do mesmo tipo em um bloco novo (o que copiaria tudo).
+    df = feather.read_table(caminho, memory_map=True).to_pandas(split_blocks=True)
+    with open(f"{caminho}.categorias.json", encoding="utf-8") as arquivo:
+        tipos = json.load(arquivo)
+    colunas = {
+        coluna: pd.Categorical.from_codes(df[coluna].to_numpy(), categories=categorias, validate=False)
+        for coluna, categorias in tipos["categorias"].items()
+    }
+    colunas.update({coluna: df[coluna].to_numpy().view(np.bool_) for coluna in tipos["booleanas"]})
+    # Com assign (ou df[coluna] = ...) o pandas copiaria os códigos; o construtor com copy=False não copia.
+    return pd.DataFrame({coluna: colunas.get(coluna, df[coluna]) for coluna in df}, copy=False)
+
+
+def salvar_grupos(grupos, pasta, nome):
+    """Grava um {chave: posições} como um único vetor de posições e os limites de cada grupo."""
+    chaves = list(grupos)
+    tamanhos = [len(grupos[chave]) for chave in chaves]
+    posicoes = np.concatenate([grupos[chave] for chave in chaves]) if chaves else np.array([], dtype=np.int64)
+    np.save(os.path.join(pasta, f"{nome}_posicoes.npy"), posicoes)
+    np.save(os.path.join(pasta, f"{nome}_limites.npy"), np.concatenate([[0], np.cumsum(tamanhos)]).astype(np.int64))
+    with open(os.path.join(pasta, f"{nome}_chaves.json"), "w", encoding="utf-8") as arquivo:
+        json.dump(chaves, arquivo, ensure_ascii=False)
+
+
+def ler_grupos(pasta, nome, chave=str):
+    # Cada grupo é uma fatia (view) do vetor mapeado, sem cópia.
+    posicoes = np.load(os.path.join(pasta, f"{nome}_posicoes.npy"), mmap_mode="r")
+    limites = np.load(os.path.join(pasta, f"{nome}_limites.npy"))
+    with open(os.path.join(pasta, f"{nome}_chaves.json"), encoding="utf-8") as arquivo:
+        chaves = json.load(arquivo)
+    return {chave(rotulo): posicoes[limites[k]:limites[k + 1]] for k, rotulo in enumerate(chaves)}
+
+
+def pasta_versao(pasta, numero):
+    return os.path.join(pasta, f"versao_{numero:06d}")
+
+
+def versao_publicada(pasta=PASTA_COMPARTILHADA):
+    """{"numero", "lotes"} da última versão publicada, ou None se o carregador ainda não publicou nada."""
+    try:
+        with open(os.path.join(pasta, ARQUIVO_ATUAL), encoding="utf-8") as arquivo:
+            return json.load(arquivo)
+    except FileNotFoundError:
+        return None
+
+
+def publicar(versao, numero, pasta=PASTA_COMPARTILHADA):
+    """Grava pedidos, cubo e índice da versão em uma pasta nova e só então aponta atual.json para ela."""
+    destino = pasta_versao(pasta, numero)
+    shutil.rmtree(destino, ignore_errors=True)
+    os.makedirs(destino)
+    salvar_frame(versao.pedidos.df, os.path.join(destino, "pedidos.arrow"))
+    cubo = versao.cubo
+    salvar_frame(cubo.totais_dia.reset_index(), os.path.join(destino, "cubo_totais_dia.arrow"))
+    for dimensao, parcial in cubo.parciais.items():
+        salvar_frame(parcial.linhas, os.path.join(destino, f"cubo_{dimensao}.arrow"))
+        np.save(os.path.join(destino, f"cubo_{dimensao}_inicio.npy"), parcial.inicio_linhas)
+    for nome in ("lojas_bitmap", "clientes_hll"):
+        np.save(os.path.join(destino, f"cubo_{nome}.npy"), getattr(cubo, nome))
+    salvar_grupos(versao.indice.estados, destino, "indice_estados")
+    salvar_grupos(versao.indice.cidades, destino, "indice_cidades")
+
+    temporario = os.path.join(pasta, ARQUIVO_ATUAL + ".tmp")
+    with open(temporario, "w", encoding="utf-8") as arquivo:
+        json.dump({"numero": numero, "lotes": sorted(versao.lotes)}, arquivo, ensure_ascii=False)
+    os.replace(temporario, os.path.join(pasta, ARQUIVO_ATUAL))
+    # Processos que já mapearam uma versão apagada continuam lendo: o arquivo só some quando o último mapa fecha.
+    antigas = sorted(nome for nome in os.listdir(pasta) if nome.startswith("versao_"))[:-VERSOES_MANTIDAS]
+    for nome in antigas:
+        shutil.rmtree(os.path.join(pasta, nome), ignore_errors=True)
+
+
+def abrir_versao(pasta=PASTA_COMPARTILHADA):
+    """(número, pedidos, cubo, índice, lotes) da versão publicada, tudo mapeado dos arquivos."""
+    publicada = versao_publicada(pasta)
+    if publicada is None:
+        raise FileNotFoundError(f"Nenhuma base publicada em {pasta}: inicie `python compartilhado_marketplace.py`.")
+    origem = pasta_versao(pasta, publicada["numero"])
+    totais_dia = ler_frame(os.path.join(origem, "cubo_totais_dia.arrow")).set_index("dia")
+    parciais = {
+        dimensao: ParcialDiaria(
+            linhas=ler_frame(os.path.join(origem, f"cubo_{dimensao}.arrow")),
+            inicio_linhas=np.load(os.path.join(origem, f"cubo_{dimensao}_inicio.npy"), mmap_mode="r"),
+        )
+        for dimensao in DIMENSOES
+    }
+    cubo = CuboVendas(
+        totais_dia=totais_dia,
+        parciais=parciais,
+        **{nome: np.load(os.path.join(origem, f"cubo_{nome}.npy"), mmap_mode="r") for nome in ("lojas_bitmap", "clientes_hll")},
+    )
+    indice = IndiceLocal(
+        estados=ler_grupos(origem, "indice_estados"),
+        cidades=ler_grupos(origem, "indice_cidades", chave=tuple),
+    )
+    df = ler_frame(os.path.join(origem, "pedidos.arrow"))
+    return publicada["numero"], df, cubo, indice, frozenset(publicada["lotes"])
+
+
+if __name__ == "__main__":
+    # Processo carregador: monta a base uma vez, publica e segue incorporando lotes novos.
+    from base_marketplace import INTERVALO_VERIFICACAO, BaseMarketplace
+
+    os.makedirs(PASTA_COMPARTILHADA, exist_ok=True)
+    anterior = versao_publicada()
+    # Os números continuam de onde a última execução parou: os caches das páginas são por número de versão.
+    deslocamento = anterior["numero"] + 1 if anterior else 0
+    base = BaseMarketplace(modo="memoria")
+    publicado = base.atual().numero
+    publicar(base.atual(), deslocamento + publicado)
+    print(f"Base publicada em {PASTA_COMPARTILHADA} (versão {deslocamento + publicado})", flush=True)
+    while True:
+        time.sleep(INTERVALO_VERIFICACAO)
+        versao = base.atualizar()
+        if versao.numero != publicado:
+            publicado = versao.numero
+            publicar(versao, deslocamento + publicado)
+            print(f"Versão {deslocamento + publicado} publicada", flush=True)
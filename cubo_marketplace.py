@@ -0,0 +1,212 @@
+from dataclasses import dataclass
+from datetime import timedelta
+
+import numpy as np
+import pandas as pd
+
+from dados_marketplace import alinhar_categorias
+
+# --- CONFIGURAÇÃO DO CUBO ---
+# Cada dimensão dos gráficos tem o seu agregado dia × dimensão; nenhum gráfico cruza duas delas.
+# Lojas ficam de fora: dia × loja tem quase uma linha por pedido, e a tabela de lojas vem dos pedidos.
+DIMENSOES = ["customer_state", "product_category_name_english"]
+# Medidas aditivas: (coluna de origem, nome da soma, nome da contagem de valores não nulos)
+MEDIDAS = [
+    ("payment_value", "valor_soma", "valor_cont"),
+    ("tempo_entrega", "tempo_soma", "tempo_cont"),
+    ("review_score", "nota_soma", "nota_cont"),
+    ("freight_value", "frete_soma", "frete_cont"),
+]
+# Colunas dos pedidos que montar_cubo lê.
+COLUNAS_CUBO = ["order_purchase_timestamp", *DIMENSOES, "seller_id", "customer_id", *(origem for origem, _, _ in MEDIDAS)]
+HLL_PRECISAO = 12  # 4096 registradores por dia, erro padrão de ~1,6%
+HLL_REGISTRADORES = 1 << HLL_PRECISAO
+
+
+def dia_local(df):
+    # Data da compra no fuso local, sem fuso, à meia-noite.
+    return df["order_purchase_timestamp"].dt.tz_localize(None).dt.normalize()
+
+
+def registros_hll(dias_codigo, n_dias, valores):
+    """Registradores HyperLogLog (um vetor por dia) para contagem aproximada de distintos."""
+    hashes = pd.util.hash_array(np.asarray(valores))
+    indice = (hashes >> np.uint64(64 - HLL_PRECISAO)).astype(np.int64)
+    resto = (hashes << np.uint64(HLL_PRECISAO)) | np.uint64(1 << (HLL_PRECISAO - 1))
+    # posição do primeiro bit 1 do que sobra do hash (o bit extra limita o valor máximo)
+    rank = (64 - np.floor(np.log2(resto.astype(np.float64)))).astype(np.uint8)
+    chave = dias_codigo.astype(np.int64) * HLL_REGISTRADORES + indice
+    maximos = pd.Series(rank).groupby(chave).max()
+    registros = np.zeros((n_dias, HLL_REGISTRADORES), dtype=np.uint8)
+    registros.flat[maximos.index.to_numpy()] = maximos.to_numpy()
+    return registros
+
+
+def estimar_hll(registros):
+    m = HLL_REGISTRADORES
+    alfa = 0.7213 / (1 + 1.079 / m)
+    estimativa = alfa * m * m / np.sum(np.exp2(-registros.astype(np.float64)))
+    vazios = int(np.count_nonzero(registros == 0))
+    if estimativa <= 2.5 * m and vazios:
+        estimativa = m * np.log(m / vazios)
+    return int(round(estimativa))
+
+
+def media(soma, contagem):
+    return soma / contagem if contagem else float("nan")
+
+
+@dataclass(frozen=True)
+class ParcialDiaria:
+    """Somas por dia × uma dimensão (estado ou categoria), ordenadas por dia."""
+    linhas: pd.DataFrame  # dia, a dimensão, pedidos e as somas/contagens de MEDIDAS
+    inicio_linhas: np.ndarray  # linhas do dia k ficam em [inicio_linhas[k], inicio_linhas[k + 1])
+
+    @property
+    def dimensao(self):
+        return self.linhas.columns[1]
+
+    def dias(self, inicio, fim):
+        """Linhas dos dias de posição [inicio, fim) nos totais diários do cubo."""
+        return self.linhas.iloc[self.inicio_linhas[inicio]:self.inicio_linhas[fim]]
+
+    def anexar(self, novo, dias, primeiro_dia_novo):
+        # Como no cubo: dias anteriores ao lote ficam como estão, os demais são reagregados.
+        antigas, novas = alinhar_categorias(self.linhas, novo.linhas, [self.dimensao])
+        corte = antigas["dia"].searchsorted(primeiro_dia_novo)
+        recentes = pd.concat([antigas.iloc[corte:], novas], ignore_index=True)
+        recentes = recentes.groupby(["dia", self.dimensao], observed=True, dropna=False, sort=True).sum().reset_index()
+        return parcial(pd.concat([antigas.iloc[:corte], recentes], ignore_index=True), dias)
+
+
+def parcial(linhas, dias):
+    return ParcialDiaria(linhas=linhas, inicio_linhas=np.append(linhas["dia"].searchsorted(dias), len(linhas)))
+
+
+@dataclass(frozen=True)
+class CuboVendas:
+    """Agregados pré-calculados por dia, por dia × estado e por dia × categoria.
+
+    Qualquer período é respondido somando os totais diários (KPIs e série
+    mensal) ou as linhas de um agregado parcial (gráficos por dimensão), sem
+    voltar aos pedidos. Lojas distintas vêm de um bitmap por dia (exato) e
+    clientes distintos de um HyperLogLog por dia (aproximado).
+    """
+    distintos_exatos = False  # a contagem exata de clientes precisa dos pedidos do período (`df_periodo`)
+
+    totais_dia: pd.DataFrame
+    parciais: dict  # dimensão -> ParcialDiaria
+    lojas_bitmap: np.ndarray
+    clientes_hll: np.ndarray
+
+    def periodo_completo(self):
+        """(primeiro, último) dia com pedidos na base."""
+        dias = self.totais_dia.index
+        return dias[0].date(), dias[-1].date()
+
+    def posicoes_dias(self, data_inicio, data_fim):
+        dias = self.totais_dia.index
+        inicio = dias.searchsorted(pd.Timestamp(data_inicio), side="left")
+        fim = dias.searchsorted(pd.Timestamp(data_fim + timedelta(days=1)), side="left")
+        return int(inicio), int(fim)
+
+    def linhas_periodo(self, data_inicio, data_fim, dimensao):
+        return self.parciais[dimensao].dias(*self.posicoes_dias(data_inicio, data_fim))
+
+    def kpis(self, data_inicio, data_fim, df_periodo=None):
+        """KPIs da Visão Geral. Com df_periodo, clientes únicos são contados de forma exata."""
+        inicio, fim = self.posicoes_dias(data_inicio, data_fim)
+        totais = self.totais_dia.iloc[inicio:fim].sum()
+        if fim > inicio:
+            lojas = np.bitwise_or.reduce(self.lojas_bitmap[inicio:fim], axis=0)
+            lojas_ativas = int(np.unpackbits(lojas).sum())
+            clientes = estimar_hll(self.clientes_hll[inicio:fim].max(axis=0))
+        else:
+            lojas_ativas = clientes = 0
+        if df_periodo is not None:
+            clientes = df_periodo["customer_id"].nunique()
+        return {
+            "pedidos": int(totais["pedidos"]),
+            "clientes": clientes,
+            "ticket_medio": media(totais["valor_soma"], totais["valor_cont"]),
+            "tempo_medio": media(totais["tempo_soma"], totais["tempo_cont"]),
+            "lojas": lojas_ativas,
+            "nota_media": media(totais["nota_soma"], totais["nota_cont"]),
+        }
+
+    def serie_mensal(self, data_inicio, data_fim):
+        """Pedidos e ticket médio por ano_mes."""
+        inicio, fim = self.posicoes_dias(data_inicio, data_fim)
+        totais = self.totais_dia.iloc[inicio:fim]
+        mensal = totais.groupby(totais.index.strftime("%Y-%m"))[["pedidos", "valor_soma", "valor_cont"]].sum()
+        mensal["payment_value"] = mensal["valor_soma"] / mensal["valor_cont"]
+        return mensal.rename_axis("ano_mes").rename(columns={"pedidos": "Pedidos"})[["Pedidos", "payment_value"]].reset_index()
+
+    def pedidos_por(self, data_inicio, data_fim, dimensao):
+        """Pedidos por estado ou categoria no período, do maior para o menor."""
+        linhas = self.linhas_periodo(data_inicio, data_fim, dimensao)
+        contagem = linhas.groupby(dimensao, observed=True)["pedidos"].sum()
+        # Empates em ordem alfabética, como no SQL: a ordem não depende dos códigos das categorias.
+        return contagem.iloc[np.lexsort((contagem.index.astype(str), -contagem.to_numpy()))]
+
+    def media_por(self, data_inicio, data_fim, dimensao, medida):
+        """Média de uma medida ("valor", "tempo", "nota" ou "frete") por dimensão no período."""
+        linhas = self.linhas_periodo(data_inicio, data_fim, dimensao)
+        somas = linhas.groupby(dimensao, observed=True)[[f"{medida}_soma", f"{medida}_cont"]].sum()
+        somas = somas[somas[f"{medida}_cont"] > 0]
+        return somas[f"{medida}_soma"] / somas[f"{medida}_cont"]
+
+    def anexar(self, novo):
+        """Combina este cubo com o cubo de um lote de pedidos novos.
+
+        Os dias anteriores ao lote são reaproveitados como estão; só os dias a
+        partir do primeiro dia do lote são reagregados.
+        """
+        totais_dia = self.totais_dia.add(novo.totais_dia, fill_value=0).astype(self.totais_dia.dtypes)
+        dias = totais_dia.index
+        primeiro_dia_novo = novo.totais_dia.index[0]
+        parciais = {
+            dimensao: self.parciais[dimensao].anexar(novo.parciais[dimensao], dias, primeiro_dia_novo)
+            for dimensao in DIMENSOES
+        }
+        pos_antigos = dias.get_indexer(self.totais_dia.index)
+        pos_novos = dias.get_indexer(novo.totais_dia.index)
+
+        lojas_bitmap = np.zeros((len(dias), novo.lojas_bitmap.shape[1]), dtype=np.uint8)
+        lojas_bitmap[pos_antigos, :self.lojas_bitmap.shape[1]] = self.lojas_bitmap
+        lojas_bitmap[pos_novos] |= novo.lojas_bitmap
+        clientes_hll = np.zeros((len(dias), HLL_REGISTRADORES), dtype=np.uint8)
+        clientes_hll[pos_antigos] = self.clientes_hll
+        clientes_hll[pos_novos] = np.maximum(clientes_hll[pos_novos], novo.clientes_hll)
+
+        return CuboVendas(totais_dia=totais_dia, parciais=parciais, lojas_bitmap=lojas_bitmap, clientes_hll=clientes_hll)
+
+
+def montar_cubo(df):
+    dia = dia_local(df).rename("dia")
+    base = pd.DataFrame({"pedidos": np.ones(len(df), dtype=np.int64)})
+    for origem, soma, contagem in MEDIDAS:
+        valores = df[origem].to_numpy(dtype=np.float64, na_value=np.nan)
+        base[soma] = np.nan_to_num(valores)
+        base[contagem] = (~np.isnan(valores)).astype(np.int64)
+    base.index = df.index
+
+    totais_dia = base.groupby(dia, sort=True).sum()
+    dias = totais_dia.index
+    parciais = {
+        dimensao: parcial(base.groupby([dia, df[dimensao]], observed=True, dropna=False, sort=True).sum().reset_index(), dias)
+        for dimensao in DIMENSOES
+    }
+    dias_codigo = dias.get_indexer(dia)
+
+    lojas_codigo = df["seller_id"].cat.codes.to_numpy()
+    presenca = np.zeros((len(dias), len(df["seller_id"].cat.categories)), dtype=bool)
+    validos = lojas_codigo >= 0
+    presenca[dias_codigo[validos], lojas_codigo[validos]] = True
+
+    return CuboVendas(
+        totais_dia=totais_dia,
+        parciais=parciais,
+        lojas_bitmap=np.packbits(presenca, axis=1),
+        clientes_hll=registros_hll(dias_codigo, len(dias), df["customer_id"]),
+    )
@@ -0,0 +1,248 @@
+import logging
+import os
+from datetime import timedelta
+import numpy as np
+import pandas as pd
+import pyarrow.feather as feather
+
+# --- CONFIGURAÇÃO DA BASE DE DADOS ---
+ARQUIVO_CSV = "dataset_olist_final_limpo.csv"
+ARQUIVO_SNAPSHOT = "dataset_olist_final_limpo.arrow"
+COLUNAS_DATA = ["order_purchase_timestamp", "order_delivered_customer_date", "order_estimated_delivery_date"]
+COLUNAS_CATEGORIA = ["seller_id", "customer_state", "customer_city", "product_category_name_english"]
+COLUNAS_ID = ["order_id", "customer_id"]
+COLUNAS_NUMERICAS = ["payment_value", "freight_value", "review_score"]
+# Colunas criadas por preparar_dados, compactadas junto com as lidas do CSV.
+COLUNAS_CATEGORIA_DERIVADAS = ["ano_mes"]
+COLUNAS_INTEIRAS = ["tempo_entrega", "dia_da_semana"]
+FUSO_HORARIO = "America/Sao_Paulo"
+COLUNAS_LOTE = COLUNAS_ID + COLUNAS_CATEGORIA + COLUNAS_NUMERICAS + COLUNAS_DATA
+PASTA_REJEITADOS = "rejeitados"  # subpasta dos novos pedidos para onde vão os lotes que não puderam ser lidos
+
+registro = logging.getLogger(__name__)
+
+
+def normalizar_fuso(serie):
+    # Datas sem fuso são tratadas como UTC; datas que já têm fuso só são convertidas.
+    try:
+        return serie.dt.tz_localize('UTC').dt.tz_convert(FUSO_HORARIO)
+    except TypeError:
+        return serie.dt.tz_convert(FUSO_HORARIO)
+
+
+def internar_ids(serie):
+    """Ids em texto (hashes hexadecimais) viram códigos inteiros de 64 bits.
+
+    O código é o hash do id, então o mesmo id tem o mesmo código em qualquer
+    lote, partição, banco ou processo, sem um dicionário compartilhado (com
+    milhões de ids a chance de colisão é desprezível). Esses ids só são
+    contados, nunca exibidos; o id de loja, que aparece nos gráficos, é uma
+    categoria: códigos inteiros com a tabela dos ids para exibição.
+    """
+    codigos = pd.Series(pd.util.hash_array(serie.to_numpy(dtype=object)).view(np.int64), index=serie.index)
+    return codigos.astype("Int64").mask(serie.isna()) if serie.hasnans else codigos
+
+
+def compactar_tipos(df):
+    """Reduz a memória da base: rótulos repetidos viram categorias, ids viram inteiros e os numéricos encolhem.
+
+    Pode ser aplicada de novo a uma base já compactada, sem efeito.
+    """
+    for coluna in COLUNAS_CATEGORIA + COLUNAS_CATEGORIA_DERIVADAS:
+        if coluna in df:
+            df[coluna] = df[coluna].astype("category")
+    for coluna in COLUNAS_ID:
+        if coluna in df and not pd.api.types.is_integer_dtype(df[coluna]):
+            df[coluna] = internar_ids(df[coluna])
+    for coluna in COLUNAS_NUMERICAS:
+        if coluna in df:
+            df[coluna] = pd.to_numeric(df[coluna], downcast="float")
+    for coluna in COLUNAS_INTEIRAS:
+        if coluna in df:
+            df[coluna] = pd.to_numeric(df[coluna], downcast="integer")
+    return df
+
+
+def preparar_dados(df, compactar=True):
+    """Normaliza os timestamps e cria as colunas derivadas usadas pelas páginas."""
+    for coluna in COLUNAS_DATA:
+        df[coluna] = normalizar_fuso(df[coluna])
+    df = df.dropna(subset=['order_delivered_customer_date', 'order_purchase_timestamp'])
+    # Ordenado pela data da compra para que os filtros de período sejam buscas binárias.
+    df = df.sort_values("order_purchase_timestamp", kind="stable", ignore_index=True)
+    df["ano_mes"] = df["order_purchase_timestamp"].dt.to_period("M").astype(str)
+    df["tempo_entrega"] = (df["order_delivered_customer_date"] - df["order_purchase_timestamp"]).dt.days
+    df["dia_da_semana"] = df["order_purchase_timestamp"].dt.dayofweek  # 0 = segunda-feira
+    df["atraso"] = df["order_delivered_customer_date"] > df["order_estimated_delivery_date"]
+    return compactar_tipos(df) if compactar else df
+
+
+def inicio_do_dia(dia):
+    # Meia-noite no fuso local; nos antigos dias de horário de verão ela não existia.
+    return pd.Timestamp(dia).tz_localize(FUSO_HORARIO, nonexistent="shift_forward")
+
+
+def posicoes_periodo(df, data_inicio, data_fim):
+    """Intervalo [inicio, fim) de linhas do período (datas inclusivas) no DataFrame ordenado."""
+    datas = df["order_purchase_timestamp"]
+    inicio = datas.searchsorted(inicio_do_dia(data_inicio), side="left")
+    fim = datas.searchsorted(inicio_do_dia(data_fim + timedelta(days=1)), side="left")
+    return int(inicio), int(fim)
+
+
+def filtrar_periodo(df, data_inicio, data_fim):
+    """Pedidos comprados entre data_inicio e data_fim (inclusive), como fatia contígua sem cópia."""
+    inicio, fim = posicoes_periodo(df, data_inicio, data_fim)
+    return df.iloc[inicio:fim]
+
+
+def dividir_periodo(df, data):
+    """Separa um DataFrame ordenado em (compras antes de `data`, compras a partir de `data`)."""
+    corte = df["order_purchase_timestamp"].searchsorted(inicio_do_dia(data), side="left")
+    return df.iloc[:corte], df.iloc[corte:]
+
+
+def ler_csv(caminho=ARQUIVO_CSV):
+    return compactar_tipos(pd.read_csv(caminho, parse_dates=COLUNAS_DATA))
+
+
+def snapshot_atualizado(caminho_csv=ARQUIVO_CSV, caminho_snapshot=ARQUIVO_SNAPSHOT):
+    if not os.path.exists(caminho_snapshot):
+        return False
+    if not os.path.exists(caminho_csv):
+        return True
+    return os.path.getmtime(caminho_snapshot) >= os.path.getmtime(caminho_csv)
+
+
+def salvar_snapshot(df, caminho_snapshot=ARQUIVO_SNAPSHOT):
+    """Grava o DataFrame tipado (datas já convertidas, categorias, ids inteiros, float32) em formato Arrow.
+
+    O arquivo é gravado sem compressão para poder ser mapeado em memória, e
+    só substitui o anterior depois de escrito por completo.
+    """
+    temporario = caminho_snapshot + ".tmp"
+    df.reset_index(drop=True).to_feather(temporario, compression="uncompressed")
+    os.replace(temporario, caminho_snapshot)
+
+
+def gerar_snapshot(caminho_csv=ARQUIVO_CSV, caminho_snapshot=ARQUIVO_SNAPSHOT):
+    df = ler_csv(caminho_csv)
+    salvar_snapshot(df, caminho_snapshot)
+    return df
+
+
+def ler_base(caminho_csv=ARQUIVO_CSV, caminho_snapshot=ARQUIVO_SNAPSHOT):
+    # Usa o snapshot quando ele é mais novo que o CSV; caso contrário relê o CSV e refaz o snapshot.
+    if snapshot_atualizado(caminho_csv, caminho_snapshot):
+        # Um snapshot gravado antes de algum tipo compacto novo é convertido na leitura.
+        return compactar_tipos(feather.read_table(caminho_snapshot, memory_map=True).to_pandas())
+    df = ler_csv(caminho_csv)
+    try:
+        salvar_snapshot(df, caminho_snapshot)
+    except OSError:
+        pass  # pasta somente leitura: segue com o CSV
+    return df
+
+
+def ler_pedidos(caminho):
+    """Lê um lote de pedidos novos em CSV ou Parquet (mesmo esquema do CSV principal)."""
+    if caminho.endswith(".parquet"):
+        df = pd.read_parquet(caminho)
+        for coluna in COLUNAS_DATA:
+            df[coluna] = pd.to_datetime(df[coluna])
+    else:
+        df = pd.read_csv(caminho, parse_dates=COLUNAS_DATA)
+    ausentes = [coluna for coluna in COLUNAS_LOTE if coluna not in df]
+    if ausentes:
+        raise ValueError(f"colunas ausentes no lote: {', '.join(ausentes)}")
+    return df
+
+
+def rejeitar_lote(pasta, nome):
+    """Move um lote inválido para a subpasta de rejeitados, onde ele não é mais procurado."""
+    try:
+        os.makedirs(os.path.join(pasta, PASTA_REJEITADOS), exist_ok=True)
+        os.replace(os.path.join(pasta, nome), os.path.join(pasta, PASTA_REJEITADOS, nome))
+    except OSError:
+        pass  # pasta somente leitura ou outra réplica já moveu: quem chamou deixa de tentar o lote
+
+
+def ler_lotes(pasta, nomes):
+    """Lê e prepara os lotes de `nomes`. Devolve (pedidos preparados ou None, nomes lidos, nomes rejeitados).
+
+    Um arquivo que não pode ser lido ou preparado (colunas faltando, valores
+    inválidos, cópia corrompida) não derruba os demais: o erro vai para o log
+    e o arquivo é movido para a subpasta de rejeitados.
+    """
+    preparados, lidos, rejeitados = [], [], []
+    for nome in nomes:
+        caminho = os.path.join(pasta, nome)
+        try:
+            preparados.append(preparar_dados(compactar_tipos(ler_pedidos(caminho))))
+        except Exception as erro:
+            registro.warning("Lote %s rejeitado e movido para %s: %r", caminho, os.path.join(pasta, PASTA_REJEITADOS), erro)
+            rejeitar_lote(pasta, nome)
+            rejeitados.append(nome)
+        else:
+            lidos.append(nome)
+    if not preparados:
+        return None, lidos, rejeitados
+    # Cada lote já vem ordenado; a ordenação estável mantém a ordem dos arquivos nos empates.
+    novos = compactar_tipos(pd.concat(preparados, ignore_index=True))
+    return novos.sort_values("order_purchase_timestamp", kind="stable", ignore_index=True), lidos, rejeitados
+
+
+def alinhar_categorias(base, novos, colunas=COLUNAS_CATEGORIA):
+    """Põe as colunas categóricas dos dois DataFrames sob as mesmas categorias.
+
+    As categorias da base vêm primeiro, então os códigos já existentes (usados
+    pelos índices e bitmaps) continuam valendo; só as novas são acrescentadas.
+    """
+    base_alinhada, novos_alinhados = {}, {}
+    for coluna in colunas:
+        categorias = base[coluna].cat.categories
+        extras = novos[coluna].cat.categories.difference(categorias)
+        if len(extras):
+            categorias = categorias.append(extras)
+            base_alinhada[coluna] = base[coluna].cat.add_categories(extras)
+        novos_alinhados[coluna] = pd.Categorical(novos[coluna], categories=categorias)
+    return base.assign(**base_alinhada), novos.assign(**novos_alinhados)
+
+
+def pedidos_retroativos(df, novos):
+    # Algum pedido do lote é anterior ao último da base (os dois já ordenados pela data da compra)?
+    return bool(len(df) and len(novos) and novos["order_purchase_timestamp"].iloc[0] < df["order_purchase_timestamp"].iloc[-1])
+
+
+def anexar_pedidos(df, novos):
+    """Junta pedidos já preparados à base ordenada. Devolve (base nova, novos alinhados)."""
+    df, novos = alinhar_categorias(df, novos, COLUNAS_CATEGORIA + COLUNAS_CATEGORIA_DERIVADAS)
+    combinado = pd.concat([df, novos], ignore_index=True)
+    if pedidos_retroativos(df, novos):
+        # Pedidos retroativos: reordena (a ordenação estável mantém a base antes dos novos no empate).
+        combinado = combinado.sort_values("order_purchase_timestamp", kind="stable", ignore_index=True)
+    return combinado, novos
+
+
+# --- RELATÓRIO DE MEMÓRIA ---
+def memoria_por_coluna(df):
+    return df.memory_usage(deep=True, index=False)
+
+
+def relatorio_memoria(caminho_csv=ARQUIVO_CSV):
+    """Bytes de cada coluna da base preparada, com os tipos que o pandas infere do CSV e depois da compactação."""
+    bruto = pd.read_csv(caminho_csv, parse_dates=COLUNAS_DATA)
+    antes = memoria_por_coluna(preparar_dados(bruto.copy(), compactar=False))
+    depois = memoria_por_coluna(preparar_dados(compactar_tipos(bruto)))
+    relatorio = pd.DataFrame({"antes": antes, "depois": depois})
+    relatorio.loc["total"] = relatorio.sum()
+    relatorio["reducao"] = relatorio["antes"] / relatorio["depois"]
+    return relatorio
+
+
+if __name__ == "__main__":
+    # Etapa de ingestão: `python dados_marketplace.py` gera o snapshot a partir do CSV e mostra o ganho de memória.
+    gerar_snapshot()
+    print(f"Snapshot gravado em {ARQUIVO_SNAPSHOT}")
+    with pd.option_context("display.float_format", "{:,.1f}".format):
+        print(relatorio_memoria())
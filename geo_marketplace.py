@@ -0,0 +1,190 @@
+import json
+import logging
+import os
+import threading
+import urllib.request
+
+import numpy as np
+import streamlit as st
+
+# --- CONFIGURAÇÃO DO MAPA ---
+URL_GEOJSON = "https://raw.githubusercontent.com/codeforamerica/click_that_hood/master/public/data/brazil-states.geojson"
+ARQUIVO_GEOJSON = "brazil-states.geojson"
+# Tolerância da simplificação em graus (0.02° ≈ 2 km); 0 desliga a simplificação.
+TOLERANCIA_SIMPLIFICACAO = float(os.environ.get("MARKETPLACE_GEO_TOLERANCIA", "0.02"))
+CASAS_DECIMAIS = 3
+PROPRIEDADES_MANTIDAS = ("sigla",)
+# Sem o arquivo versionado, o app o gera uma vez em segundo plano; 0 desliga o download.
+BAIXAR_SE_AUSENTE = os.environ.get("MARKETPLACE_GEO_BAIXAR", "1") not in ("", "0")
+
+registro = logging.getLogger(__name__)
+_trava_preparo = threading.Lock()
+_preparo = {}  # {caminho: thread} dos downloads já iniciados neste processo
+
+
+def douglas_peucker(pontos, tolerancia):
+    """Índices dos pontos mantidos por Douglas-Peucker (o primeiro e o último sempre ficam)."""
+    manter = np.zeros(len(pontos), dtype=bool)
+    manter[0] = manter[-1] = True
+    pilha = [(0, len(pontos) - 1)]
+    while pilha:
+        inicio, fim = pilha.pop()
+        if fim - inicio < 2:
+            continue
+        a, b = pontos[inicio], pontos[fim]
+        meio = pontos[inicio + 1:fim]
+        segmento = b - a
+        comprimento = np.hypot(*segmento)
+        if comprimento == 0:
+            distancias = np.hypot(*(meio - a).T)
+        else:
+            relativos = meio - a
+            distancias = np.abs(segmento[0] * relativos[:, 1] - segmento[1] * relativos[:, 0]) / comprimento
+        maior = int(np.argmax(distancias))
+        if distancias[maior] > tolerancia:
+            indice = inicio + 1 + maior
+            manter[indice] = True
+            pilha += [(inicio, indice), (indice, fim)]
+    return np.flatnonzero(manter)
+
+
+def simplificar_geojson(geojson, tolerancia=TOLERANCIA_SIMPLIFICACAO, casas=CASAS_DECIMAIS):
+    """Simplifica os polígonos preservando a topologia entre estados vizinhos.
+
+    Os anéis são quebrados nos nós (vértices onde muda o conjunto de anéis que
+    compartilham o ponto), cada arco é simplificado uma única vez e os
+    vizinhos reaproveitam o mesmo resultado, então não surgem buracos nem
+    sobreposições nas fronteiras. Também arredonda as coordenadas e descarta
+    as propriedades que o mapa não usa.
+    """
+    aneis = []
+    for feicao in geojson["features"]:
+        geometria = feicao["geometry"]
+        poligonos = [geometria["coordinates"]] if geometria["type"] == "Polygon" else geometria["coordinates"]
+        for poligono in poligonos:
+            for anel in poligono:
+                aneis.append([tuple(round(c, casas) for c in ponto[:2]) for ponto in anel[:-1]])
+
+    donos = {}
+    for numero, anel in enumerate(aneis):
+        for ponto in anel:
+            donos.setdefault(ponto, set()).add(numero)
+
+    mantidos_por_arco = {}
+    novos_aneis = []
+    for anel in aneis:
+        n = len(anel)
+        nos = [
+            i for i in range(n)
+            if donos[anel[i]] != donos[anel[i - 1]] or donos[anel[i]] != donos[anel[(i + 1) % n]]
+        ]
+        if not nos:
+            nos = [0]
+        novo = []
+        for k, inicio in enumerate(nos):
+            fim = nos[(k + 1) % len(nos)]
+            arco = anel[inicio:fim + 1] if fim > inicio else anel[inicio:] + anel[:fim + 1]
+            # Arcos compartilhados aparecem em sentidos opostos nos dois estados vizinhos;
+            # simplificar sempre no mesmo sentido garante que a fronteira continue idêntica.
+            chave = min(tuple(arco), tuple(arco[::-1]))
+            if chave not in mantidos_por_arco:
+                mantidos_por_arco[chave] = (
+                    douglas_peucker(np.array(chave, dtype=np.float64), tolerancia)
+                    if tolerancia > 0 else np.arange(len(chave))
+                )
+            mantidos = mantidos_por_arco[chave]
+            if tuple(arco) != chave:
+                mantidos = (len(arco) - 1 - mantidos)[::-1]
+            novo.extend(arco[i] for i in mantidos[:-1])
+        if len(novo) < 3:
+            novo = anel  # anel pequeno demais para simplificar sem sumir
+        novos_aneis.append([list(ponto) for ponto in novo] + [list(novo[0])])
+
+    posicao = iter(novos_aneis)
+    feicoes = []
+    for feicao in geojson["features"]:
+        geometria = feicao["geometry"]
+        if geometria["type"] == "Polygon":
+            coordenadas = [next(posicao) for _ in geometria["coordinates"]]
+        else:
+            coordenadas = [[next(posicao) for _ in poligono] for poligono in geometria["coordinates"]]
+        feicoes.append({
+            "type": "Feature",
+            "properties": {k: feicao["properties"][k] for k in PROPRIEDADES_MANTIDAS if k in feicao["properties"]},
+            "geometry": {"type": geometria["type"], "coordinates": coordenadas},
+        })
+    return {"type": "FeatureCollection", "features": feicoes}
+
+
+def baixar_geojson(url=URL_GEOJSON):
+    with urllib.request.urlopen(url, timeout=30) as resposta:
+        return json.load(resposta)
+
+
+def gravar_geojson(geojson, caminho=ARQUIVO_GEOJSON):
+    temporario = caminho + ".tmp"
+    with open(temporario, "w", encoding="utf-8") as arquivo:
+        json.dump(geojson, arquivo, ensure_ascii=False, separators=(",", ":"))
+    os.replace(temporario, caminho)
+
+
+@st.cache_resource(show_spinner=False)
+def ler_geojson(caminho, modificado):
+    # `modificado` entra na chave: se o arquivo for trocado, ele é relido.
+    with open(caminho, encoding="utf-8") as arquivo:
+        return json.load(arquivo)
+
+
+def preparar_geojson(caminho=ARQUIVO_GEOJSON, url=URL_GEOJSON):
+    """Baixa o GeoJSON original e grava a versão simplificada em `caminho`."""
+    try:
+        gravar_geojson(simplificar_geojson(baixar_geojson(url)), caminho)
+    except Exception:
+        registro.exception("Não foi possível gerar %s a partir de %s", caminho, url)
+
+
+def preparar_em_segundo_plano(caminho=ARQUIVO_GEOJSON):
+    """Dispara, uma vez por processo, a geração do arquivo numa thread fora do rerun."""
+    with _trava_preparo:
+        if caminho not in _preparo:
+            _preparo[caminho] = threading.Thread(target=preparar_geojson, args=(caminho,), daemon=True)
+            _preparo[caminho].start()
+
+
+def carregar_geojson(caminho=ARQUIVO_GEOJSON):
+    """GeoJSON dos estados, já simplificado, lido do arquivo que acompanha o app uma vez por processo.
+
+    A página nunca espera pela rede: o arquivo é gerado pela etapa de ingestão
+    (`python geo_marketplace.py`). Se ele não estiver lá, o download e a
+    simplificação rodam uma vez em segundo plano e, enquanto isso, devolve None
+    sem guardar a ausência no cache; o mapa aparece no rerun seguinte.
+    """
+    if not os.path.exists(caminho):
+        if BAIXAR_SE_AUSENTE:
+            preparar_em_segundo_plano(caminho)
+        return None
+    return ler_geojson(caminho, os.path.getmtime(caminho))
+
+
+if __name__ == "__main__":
+    # Etapa de ingestão: `python geo_marketplace.py` baixa o GeoJSON original, grava a versão
+    # simplificada em brazil-states.geojson (o arquivo versionado com o app) e compara os dois.
+    import time
+
+    import pandas as pd
+    import plotly.express as px
+
+    original = baixar_geojson()
+    simplificado = simplificar_geojson(original)
+    gravar_geojson(simplificado)
+    estados = pd.DataFrame({
+        "state_code": [f["properties"]["sigla"] for f in original["features"]],
+        "orders": range(len(original["features"])),
+    })
+    for nome, geojson in [("original", original), ("simplificado", simplificado)]:
+        inicio = time.perf_counter()
+        figura = px.choropleth(estados, geojson=geojson, locations="state_code", featureidkey="properties.sigla", color="orders")
+        payload = figura.to_json()
+        print(f"{nome}: GeoJSON {len(json.dumps(geojson)) / 1e3:.0f} kB | figura {len(payload) / 1e3:.0f} kB | "
+              f"montagem + serialização {1e3 * (time.perf_counter() - inicio):.0f} ms")
+    print(f"Versão simplificada gravada em {ARQUIVO_GEOJSON}")
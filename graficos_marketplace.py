@@ -0,0 +1,142 @@
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+
+import numpy as np
+import plotly.io as pio
+import streamlit as st
+
+from perfil_marketplace import contar_cache, medir
+
+try:
+    # Peças internas que o próprio st.plotly_chart usa para montar a mensagem do gráfico.
+    from streamlit.elements.lib.form_utils import current_form_id
+    from streamlit.elements.lib.layout_utils import LayoutConfig
+    from streamlit.elements.lib.utils import compute_and_register_element_id
+    from streamlit.proto.PlotlyChart_pb2 import PlotlyChart as PlotlyChartProto
+except ImportError:  # outra versão do Streamlit: os gráficos voltam a passar por st.plotly_chart
+    PlotlyChartProto = None
+
+# --- CACHE DE FIGURAS ---
+LIMITE_FIGURAS = 256
+ALTURA_PADRAO = 450  # altura do plotly.js quando a figura não define uma (a mesma que o st.plotly_chart usa)
+# Atributos que o plotly.express grava em todo trace e que, com um trace só, repetem o padrão.
+ATRIBUTOS_REDUNDANTES = {"legendgroup": "", "offsetgroup": "", "alignmentgroup": "True"}
+
+
+@dataclass(frozen=True)
+class GraficoSerializado:
+    """Figura já convertida no JSON que vai para o navegador, com a altura do layout."""
+    spec: str
+    altura: int
+
+
+class CacheFiguras:
+    """LRU de gráficos prontos (já serializados), compartilhado por todas as sessões do processo."""
+
+    def __init__(self, limite=LIMITE_FIGURAS):
+        self.limite = limite
+        self._figuras = OrderedDict()
+        self._trava = threading.Lock()
+
+    def obter(self, chave, construir):
+        with self._trava:
+            figura = self._figuras.get(chave)
+            if figura is not None:
+                self._figuras.move_to_end(chave)
+                contar_cache("figuras", acerto=True)
+                return figura
+        contar_cache("figuras", acerto=False)
+        figura = construir()
+        with self._trava:
+            self._figuras[chave] = figura
+            while len(self._figuras) > self.limite:
+                self._figuras.popitem(last=False)
+        return figura
+
+
+def compactar_arranjo(valores):
+    """float64/int64 viram float32/int32, que o Plotly manda em base64 com metade dos bytes."""
+    if not isinstance(valores, np.ndarray):
+        return valores
+    if valores.dtype == np.float64:
+        return valores.astype(np.float32)
+    if valores.dtype == np.int64 and len(valores) and np.abs(valores).max() < 2**31:
+        return valores.astype(np.int32)
+    return valores
+
+
+def compactar_figura(figura):
+    """Enxuga a figura antes de ela ser reaproveitada e serializada a cada rerun.
+
+    Os eixos numéricos vão em 32 bits (precisão de sobra para contagens,
+    reais e dias), `customdata` sai quando o hovertemplate não o usa e, em
+    figuras de um trace só, saem os metadados de agrupamento que o
+    plotly.express repete em todo trace.
+    """
+    um_trace = len(figura.data) == 1
+    for trace in figura.data:
+        for eixo in ("x", "y", "z"):
+            if eixo in trace and trace[eixo] is not None:
+                trace[eixo] = compactar_arranjo(trace[eixo])
+        if "customdata" in trace and trace.customdata is not None:
+            if "customdata" in (trace.hovertemplate or ""):
+                trace.customdata = compactar_arranjo(trace.customdata)
+            else:
+                trace.customdata = None
+        if um_trace:
+            for atributo, padrao in ATRIBUTOS_REDUNDANTES.items():
+                if atributo in trace and trace[atributo] == padrao:
+                    trace[atributo] = None
+        if "marker" in trace and "pattern" in trace.marker and trace.marker.pattern.shape == "":
+            trace.marker.pattern = None
+    return figura
+
+
+def serializar_figura(figura):
+    """JSON da figura exatamente como st.plotly_chart o geraria, para ser feito uma vez só."""
+    return GraficoSerializado(
+        spec=pio.to_json(figura.to_dict(), validate=False),
+        altura=int(figura.layout.height or ALTURA_PADRAO),
+    )
+
+
+def enviar_grafico(grafico):
+    """Envia um gráfico já serializado, com a mesma mensagem que st.plotly_chart montaria.
+
+    O st.plotly_chart sempre refaz to_dict + to_json da figura (de 2,5 a 7 ms
+    por gráfico a cada rerun); aqui o JSON guardado no cache vai como está.
+    """
+    dg = st._main
+    proto = PlotlyChartProto(spec=grafico.spec, config="{}", theme="streamlit", form_id=current_form_id(dg))
+    proto.id = compute_and_register_element_id(
+        "plotly_chart", user_key=None, key_as_main_identity=False, dg=dg,
+        plotly_spec=proto.spec, plotly_config=proto.config, selection_mode=("points", "box", "lasso"),
+        is_selection_activated=False, theme="streamlit", width="stretch", height="content", alt=None,
+    )
+    dg._enqueue("plotly_chart", proto, layout_config=LayoutConfig(width="stretch", height=grafico.altura))
+
+
+@st.cache_resource
+def carregar_cache_figuras():
+    return CacheFiguras()
+
+
+def mostrar_grafico(id_grafico, filtros, construir):
+    """Desenha um gráfico reaproveitando o JSON já gerado para os mesmos filtros.
+
+    `filtros` deve identificar tudo o que muda o gráfico (versão da base,
+    período, cidades...); `construir` só roda quando a combinação é nova.
+    """
+    def montar():
+        with medir(f"grafico/{id_grafico}/montar"):
+            figura = compactar_figura(construir())
+            return figura if PlotlyChartProto is None else serializar_figura(figura)
+
+    with medir(f"grafico/{id_grafico}"):
+        grafico = carregar_cache_figuras().obter((id_grafico, filtros), montar)
+        with medir(f"grafico/{id_grafico}/plotly_chart"):
+            if PlotlyChartProto is None:
+                st.plotly_chart(grafico, use_container_width=True)
+            else:
+                enviar_grafico(grafico)
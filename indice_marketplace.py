@@ -0,0 +1,83 @@
+from dataclasses import dataclass, field
+
+import numpy as np
+
+# --- REGIÕES DO BRASIL ---
+REGIOES = {
+    "Norte": ("AC", "AP", "AM", "PA", "RO", "RR", "TO"),
+    "Nordeste": ("AL", "BA", "CE", "MA", "PB", "PE", "PI", "RN", "SE"),
+    "Centro-Oeste": ("DF", "GO", "MT", "MS"),
+    "Sudeste": ("ES", "MG", "RJ", "SP"),
+    "Sul": ("PR", "RS", "SC"),
+}
+
+
+def estados_das_regioes(regioes):
+    return tuple(estado for regiao in regioes for estado in REGIOES[regiao])
+
+
+def agrupar_posicoes(chaves, rotulo, deslocamento=0):
+    """{rótulo: posições das linhas com essa chave}, cada vetor em ordem crescente; chaves negativas são nulos."""
+    ordem = np.argsort(chaves, kind="stable")  # estável: dentro de cada grupo as posições seguem crescentes
+    ordenadas = chaves[ordem]
+    inicios = np.flatnonzero(np.diff(ordenadas, prepend=-2))
+    grupos = np.split(ordem.astype(np.int64) + deslocamento, inicios[1:])
+    return {rotulo(ordenadas[i]): grupo for i, grupo in zip(inicios, grupos) if ordenadas[i] >= 0}
+
+
+@dataclass(frozen=True)
+class IndiceLocal:
+    """Índice invertido de estado e de (estado, cidade) para as posições das linhas na base.
+
+    Como a base é ordenada pela data da compra, as posições de cada grupo já
+    saem em ordem cronológica, e recortar um período é uma busca binária em
+    cada grupo em vez de varrer as colunas de estado e cidade.
+    """
+    estados: dict
+    cidades: dict
+    _cidades_por_regiao: dict = field(default_factory=dict, compare=False, repr=False)
+
+    def posicoes(self, estados, cidades=(), inicio=0, fim=None):
+        """Posições (crescentes) das linhas dos estados, e das cidades se dadas, dentro de [inicio, fim)."""
+        if cidades:
+            grupos = [self.cidades[(estado, cidade)] for estado in estados for cidade in cidades if (estado, cidade) in self.cidades]
+        else:
+            grupos = [self.estados[estado] for estado in estados if estado in self.estados]
+        fim = np.iinfo(np.int64).max if fim is None else fim
+        recortes = [grupo[grupo.searchsorted(inicio):grupo.searchsorted(fim)] for grupo in grupos]
+        if not recortes:
+            return np.array([], dtype=np.int64)
+        return np.sort(np.concatenate(recortes))
+
+    def cidades_da_regiao(self, estados):
+        """Nomes das cidades dos estados dados, em ordem alfabética; calculado uma vez por região."""
+        chave = tuple(sorted(estados))
+        if chave not in self._cidades_por_regiao:
+            nomes = {cidade for estado, cidade in self.cidades if estado in chave}
+            self._cidades_por_regiao[chave] = sorted(nomes)
+        return self._cidades_por_regiao[chave]
+
+    def anexar(self, novo):
+        """Estende o índice com o de um lote anexado ao fim da base (posições já deslocadas)."""
+        return IndiceLocal(estados=juntar_grupos(self.estados, novo.estados), cidades=juntar_grupos(self.cidades, novo.cidades))
+
+
+def juntar_grupos(antigos, novos):
+    juntos = dict(antigos)
+    for chave, posicoes in novos.items():
+        juntos[chave] = np.concatenate([juntos[chave], posicoes]) if chave in juntos else posicoes
+    return juntos
+
+
+def montar_indice(df, deslocamento=0):
+    """Índice das linhas de `df`; com deslocamento, para um lote que começa nessa posição da base."""
+    estado = df["customer_state"].cat
+    cidade = df["customer_city"].cat
+    codigos_estado = estado.codes.to_numpy(dtype=np.int64)
+    codigos_cidade = cidade.codes.to_numpy(dtype=np.int64)
+    n_cidades = len(cidade.categories)
+    pares = np.where((codigos_estado >= 0) & (codigos_cidade >= 0), codigos_estado * n_cidades + codigos_cidade, -1)
+    return IndiceLocal(
+        estados=agrupar_posicoes(codigos_estado, lambda k: estado.categories[k], deslocamento),
+        cidades=agrupar_posicoes(pares, lambda k: (estado.categories[k // n_cidades], cidade.categories[k % n_cidades]), deslocamento),
+    )
@@ -1,7 +1,12 @@
 import streamlit as st
-import pandas as pd
 import plotly.express as px
 from datetime import timedelta, date
+from base_marketplace import versao_atual
+from geo_marketplace import carregar_geojson
+from graficos_marketplace import mostrar_grafico
+from analise_marketplace import get_periodo_anterior, variacao_absoluta, variacao_percentual
+from perfil_marketplace import iniciar_rerun, medir, mostrar_painel
+from planos_marketplace import aquecer_periodos, prefetch_abas, resultados_aba
 
 # --- CONFIGURAÇÃO INICIAL DA PÁGINA ---
 st.set_page_config(
@@ -9,6 +14,7 @@ st.set_page_config(
     page_title="Dashboard | Marketplace",
     #page_icon=""  # troque se quiser outro favicon!
 )
+iniciar_rerun("Dashboard")
 
 # --- ESTILOS CSS ---
 st.markdown("""
@@ -18,27 +24,11 @@ st.markdown("""
     </style>
 """, unsafe_allow_html=True)
 
-# --- FUNÇÕES DE LÓGICA ---
-@st.cache_data
-def carregar_dados():
-    df = pd.read_csv("dataset_olist_final_limpo.csv", parse_dates=["order_purchase_timestamp", "order_delivered_customer_date"])
-    try:
-        df['order_purchase_timestamp'] = df['order_purchase_timestamp'].dt.tz_localize('UTC').dt.tz_convert('America/Sao_Paulo')
-        df['order_delivered_customer_date'] = df['order_delivered_customer_date'].dt.tz_localize('UTC').dt.tz_convert('America/Sao_Paulo')
-    except TypeError:
-        df['order_purchase_timestamp'] = df['order_purchase_timestamp'].dt.tz_convert('America/Sao_Paulo')
-        df['order_delivered_customer_date'] = df['order_delivered_customer_date'].dt.tz_convert('America/Sao_Paulo')
-    df["ano_mes"] = df["order_purchase_timestamp"].dt.to_period("M").astype(str)
-    df.dropna(subset=['order_delivered_customer_date', 'order_purchase_timestamp'], inplace=True)
-    df["tempo_entrega"] = (df["order_delivered_customer_date"] - df["order_purchase_timestamp"]).dt.days
-    df["dia_da_semana"] = df["order_purchase_timestamp"].dt.day_name()
-    return df
-
 # --- LÓGICA DA PÁGINA DO DASHBOARD ---
 st.title("📊 Dashboard de Análise do Marketplace")
 
 try:
-    df = carregar_dados()
+    versao = versao_atual()
 except Exception as e:
     st.error(f"Erro ao carregar os dados: {e}")
     st.stop()
@@ -51,8 +41,7 @@ st.sidebar.markdown("---")
 def atualizar_periodo():
     st.session_state.date_range = st.session_state.filtro_data_slider
 
-data_min_geral = df["order_purchase_timestamp"].min().date()
-data_max_geral = df["order_purchase_timestamp"].max().date()
+data_min_geral, data_max_geral = versao.cubo.periodo_completo()
 
 if 'date_range' not in st.session_state:
     st.session_state.date_range = (data_min_geral, data_max_geral)
@@ -75,132 +64,172 @@ st.sidebar.markdown("---")
 
 # --- CONTEÚDO PRINCIPAL ---
 start_date, end_date = st.session_state.date_range
-df_filtrado = df[
-    (df["order_purchase_timestamp"].dt.date >= start_date) &
-    (df["order_purchase_timestamp"].dt.date <= end_date)
-]
+
+# Tudo o que muda os gráficos: versão da base e período.
+filtros = (versao.numero, start_date, end_date)
 
 st.info(f"Exibindo dados de **{start_date.strftime('%d/%m/%Y')}** a **{end_date.strftime('%d/%m/%Y')}**.", icon="✅")
 st.markdown("---")
 
 if selecao_dashboard == "Visão Geral":
     st.subheader("📌 Visão Geral do Período Selecionado")
+    # No SQL o cubo já conta clientes distintos exatamente: não há estimativa para trocar.
+    contagem_exata = versao.cubo.distintos_exatos or st.sidebar.checkbox(
+        "Contagem exata de clientes únicos",
+        help="Por padrão, clientes únicos são estimados (HyperLogLog, erro de ~2%) a partir dos agregados diários."
+    )
+    inicio_anterior, fim_anterior = get_periodo_anterior(start_date, end_date)
+    plano = resultados_aba(selecao_dashboard, versao, start_date, end_date, clientes_exatos=contagem_exata)
+    resumo, anterior = plano["kpis"], plano["kpis_anteriores"]
     cols = st.columns(3)
     kpis = [
-        ("Pedidos", f'{len(df_filtrado):,}'),
-        ("Clientes Únicos", f'{df_filtrado["customer_id"].nunique():,}'),
-        ("Ticket Médio (R$)", f"{df_filtrado['payment_value'].mean():.2f}"),
-        ("Tempo Médio Entrega", f"{df_filtrado['tempo_entrega'].mean():.1f} dias"),
-        ("Lojas Ativas", f'{df_filtrado["seller_id"].nunique():,}'),
-        ("Nota Média", f'{df_filtrado["review_score"].mean():.2f}')
+        ("Pedidos", f'{resumo["pedidos"]:,}', variacao_percentual(resumo["pedidos"], anterior["pedidos"]), "normal"),
+        ("Clientes Únicos" if contagem_exata else "Clientes Únicos (≈)", f'{resumo["clientes"]:,}', variacao_percentual(resumo["clientes"], anterior["clientes"]), "normal"),
+        ("Ticket Médio (R$)", f"{resumo['ticket_medio']:.2f}", variacao_percentual(resumo["ticket_medio"], anterior["ticket_medio"]), "normal"),
+        ("Tempo Médio Entrega", f"{resumo['tempo_medio']:.1f} dias", variacao_absoluta(resumo["tempo_medio"], anterior["tempo_medio"], "{:+.1f} dias"), "inverse"),
+        ("Lojas Ativas", f'{resumo["lojas"]:,}', variacao_percentual(resumo["lojas"], anterior["lojas"]), "normal"),
+        ("Nota Média", f'{resumo["nota_media"]:.2f}', variacao_absoluta(resumo["nota_media"], anterior["nota_media"]), "normal")
     ]
-    for i, (k, v) in enumerate(kpis):
+    for i, (k, v, delta, cor) in enumerate(kpis):
         with cols[i % 3]:
-            st.metric(label=k, value=v)
+            st.metric(label=k, value=v, delta=delta, delta_color=cor)
+    st.caption(f"Variações em relação a {inicio_anterior.strftime('%d/%m/%Y')} – {fim_anterior.strftime('%d/%m/%Y')}.")
 
     st.markdown("---")
     col_graf_1, col_graf_2 = st.columns(2)
     with col_graf_1:
-        pedidos_mes = df_filtrado.groupby("ano_mes").size().reset_index(name="Pedidos")
-        fig = px.bar(pedidos_mes, x="ano_mes", y="Pedidos", title="Pedidos por Mês")
-        st.plotly_chart(fig, use_container_width=True)
+        def grafico_pedidos_mes():
+            return px.bar(plano["serie_mensal"], x="ano_mes", y="Pedidos", title="Pedidos por Mês")
+        mostrar_grafico("dashboard/pedidos_mes", filtros, grafico_pedidos_mes)
     with col_graf_2:
-        ticket_medio = df_filtrado.groupby("ano_mes")["payment_value"].mean().reset_index()
-        fig2 = px.line(ticket_medio, x="ano_mes", y="payment_value", title="Ticket Médio por Mês")
-        st.plotly_chart(fig2, use_container_width=True)
+        def grafico_ticket_mes():
+            return px.line(plano["serie_mensal"], x="ano_mes", y="payment_value", title="Ticket Médio por Mês")
+        mostrar_grafico("dashboard/ticket_mes", filtros, grafico_ticket_mes)
     st.markdown("---")
     col3, col4 = st.columns(2)
     with col3:
-        df_cat_filtered = df_filtrado.dropna(subset=['product_category_name_english'])
-        top_categorias = df_cat_filtered['product_category_name_english'].value_counts().nlargest(10).reset_index()
-        top_categorias.columns = ['Categoria', 'Pedidos']
-        fig3 = px.bar(top_categorias, x='Pedidos', y='Categoria', orientation='h', title='Top 10 Categorias Mais Vendidas')
-        fig3.update_layout(yaxis={'categoryorder': 'total ascending'})
-        st.plotly_chart(fig3, use_container_width=True)
+        def grafico_top_categorias():
+            top_categorias = plano["top_categorias"].reset_index()
+            top_categorias.columns = ['Categoria', 'Pedidos']
+            fig3 = px.bar(top_categorias, x='Pedidos', y='Categoria', orientation='h', title='Top 10 Categorias Mais Vendidas')
+            fig3.update_layout(yaxis={'categoryorder': 'total ascending'})
+            return fig3
+        mostrar_grafico("dashboard/top_categorias", filtros, grafico_top_categorias)
     with col4:
-        vendas_por_estado = df_filtrado['customer_state'].value_counts().reset_index()
-        vendas_por_estado.columns = ['state_code', 'orders']
-        fig4 = px.choropleth(
-            vendas_por_estado,
-            geojson="https://raw.githubusercontent.com/codeforamerica/click_that_hood/master/public/data/brazil-states.geojson",
-            locations='state_code',
-            featureidkey="properties.sigla",
-            color='orders',
-            color_continuous_scale="Purples",
-            scope="south america",
-            title="Mapa de Pedidos por Estado"
-        )
-        fig4.update_geos(fitbounds="locations", visible=False)
-        st.plotly_chart(fig4, use_container_width=True)
+        with medir("dados/geojson"):
+            geojson_estados = carregar_geojson()
+        if geojson_estados is None:
+            st.info("Mapa indisponível: brazil-states.geojson ainda não existe. Ele está sendo gerado em segundo plano "
+                    "(ou gere-o com `python geo_marketplace.py`) e o mapa aparece na próxima atualização da página.", icon="🗺️")
+        else:
+            def grafico_mapa_estados():
+                vendas_por_estado = plano["pedidos_estado"].reset_index()
+                vendas_por_estado.columns = ['state_code', 'orders']
+                fig4 = px.choropleth(
+                    vendas_por_estado,
+                    geojson=geojson_estados,
+                    locations='state_code',
+                    featureidkey="properties.sigla",
+                    color='orders',
+                    color_continuous_scale="Purples",
+                    scope="south america",
+                    title="Mapa de Pedidos por Estado"
+                )
+                fig4.update_geos(fitbounds="locations", visible=False)
+                return fig4
+            mostrar_grafico("dashboard/mapa_estados", filtros, grafico_mapa_estados)
 
 elif selecao_dashboard == "Análise de Lojas":
     st.subheader("🏬 Análise de Lojas (Sellers) no Período")
-    top_lojas = df_filtrado["seller_id"].value_counts().head(10).reset_index()
-    top_lojas.columns = ["Loja", "Pedidos"]
-    fig = px.bar(top_lojas, x="Pedidos", y="Loja", title="Top 10 Lojas com Mais Pedidos", orientation='h')
-    fig.update_layout(yaxis={'categoryorder': 'total ascending'})
-    st.plotly_chart(fig, use_container_width=True)
+    plano = resultados_aba(selecao_dashboard, versao, start_date, end_date)
+    def grafico_top_lojas():
+        top_lojas = plano["top_lojas"].reset_index()
+        top_lojas.columns = ["Loja", "Pedidos"]
+        fig = px.bar(top_lojas, x="Pedidos", y="Loja", title="Top 10 Lojas com Mais Pedidos", orientation='h')
+        fig.update_layout(yaxis={'categoryorder': 'total ascending'})
+        return fig
+    mostrar_grafico("dashboard/top_lojas", filtros, grafico_top_lojas)
 
     col1, col2 = st.columns(2)
     with col1:
-        top_ticket = df_filtrado.groupby("seller_id")["payment_value"].mean().nlargest(10).reset_index()
-        top_ticket.columns = ["Loja", "Ticket Médio"]
-        fig2 = px.bar(top_ticket, x="Ticket Médio", y="Loja", title="Top 10 Lojas por Ticket Médio", orientation='h')
-        fig2.update_layout(yaxis={'categoryorder': 'total ascending'})
-        st.plotly_chart(fig2, use_container_width=True)
+        def grafico_top_ticket():
+            top_ticket = plano["top_ticket"].reset_index()
+            top_ticket.columns = ["Loja", "Ticket Médio"]
+            fig2 = px.bar(top_ticket, x="Ticket Médio", y="Loja", title="Top 10 Lojas por Ticket Médio", orientation='h')
+            fig2.update_layout(yaxis={'categoryorder': 'total ascending'})
+            return fig2
+        mostrar_grafico("dashboard/top_ticket", filtros, grafico_top_ticket)
     with col2:
-        top_avaliacao = df_filtrado.groupby("seller_id")["review_score"].mean().nlargest(10).reset_index()
-        top_avaliacao.columns = ["Loja", "Nota Média"]
-        fig3 = px.bar(top_avaliacao, x="Nota Média", y="Loja", title="Top 10 Lojas por Avaliação", orientation='h')
-        fig3.update_layout(yaxis={'categoryorder': 'total ascending'}, xaxis_range=[3.5, 5])
-        st.plotly_chart(fig3, use_container_width=True)
+        def grafico_top_avaliacao():
+            top_avaliacao = plano["top_avaliacao"].reset_index()
+            top_avaliacao.columns = ["Loja", "Nota Média"]
+            fig3 = px.bar(top_avaliacao, x="Nota Média", y="Loja", title="Top 10 Lojas por Avaliação", orientation='h')
+            fig3.update_layout(yaxis={'categoryorder': 'total ascending'}, xaxis_range=[3.5, 5])
+            return fig3
+        mostrar_grafico("dashboard/top_avaliacao", filtros, grafico_top_avaliacao)
 
 elif selecao_dashboard == "Análise de Logística":
     st.subheader("🚚 Análise de Logística no Período")
+    plano = resultados_aba(selecao_dashboard, versao, start_date, end_date)
 
     col1, col2 = st.columns(2)
     with col1:
-        tempo_estado = df_filtrado.groupby("customer_state")["tempo_entrega"].mean().sort_values().reset_index()
-        fig = px.bar(
-            tempo_estado, x="tempo_entrega", y="customer_state",
-            title="Tempo Médio de Entrega por Estado", orientation='h'
-        )
-        fig.update_layout(
-            yaxis={'categoryorder': 'total ascending'},
-            xaxis_title="Tempo Médio (dias)", yaxis_title="Estado"
-        )
-        st.plotly_chart(fig, use_container_width=True)
+        def grafico_tempo_estado():
+            tempo_estado = plano["tempo_estado"].rename("tempo_entrega").reset_index()
+            fig = px.bar(
+                tempo_estado, x="tempo_entrega", y="customer_state",
+                title="Tempo Médio de Entrega por Estado", orientation='h'
+            )
+            fig.update_layout(
+                yaxis={'categoryorder': 'total ascending'},
+                xaxis_title="Tempo Médio (dias)", yaxis_title="Estado"
+            )
+            return fig
+        mostrar_grafico("dashboard/tempo_estado", filtros, grafico_tempo_estado)
     with col2:
-        frete_estado = df_filtrado.groupby("customer_state")["freight_value"].mean().sort_values().reset_index()
-        fig2 = px.bar(
-            frete_estado, x="freight_value", y="customer_state",
-            title="Custo Médio do Frete por Estado", orientation='h'
-        )
-        fig2.update_layout(
-            yaxis={'categoryorder': 'total ascending'},
-            xaxis_title="Frete Médio (R$)", yaxis_title="Estado"
-        )
-        st.plotly_chart(fig2, use_container_width=True)
+        def grafico_frete_estado():
+            frete_estado = plano["frete_estado"].rename("freight_value").reset_index()
+            fig2 = px.bar(
+                frete_estado, x="freight_value", y="customer_state",
+                title="Custo Médio do Frete por Estado", orientation='h'
+            )
+            fig2.update_layout(
+                yaxis={'categoryorder': 'total ascending'},
+                xaxis_title="Frete Médio (R$)", yaxis_title="Estado"
+            )
+            return fig2
+        mostrar_grafico("dashboard/frete_estado", filtros, grafico_frete_estado)
 
     st.markdown("---")
     st.subheader("🏆 Performance de Entrega dos Vendedores")
 
     col3, col4 = st.columns(2)
     with col3:
-        vendedores_rapidos = df_filtrado.groupby('seller_id')['tempo_entrega'].mean().nsmallest(5).sort_values(ascending=False).reset_index()
-        vendedores_rapidos.columns = ['Vendedor', 'Tempo Médio']
-        fig3 = px.bar(
-            vendedores_rapidos, x='Tempo Médio', y='Vendedor',
-            orientation='h', title='Top 5 Vendedores Mais Rápidos'
-        )
-        fig3.update_layout(xaxis_title="Tempo Médio (dias)", yaxis_title="ID do Vendedor")
-        st.plotly_chart(fig3, use_container_width=True)
+        def grafico_vendedores_rapidos():
+            vendedores_rapidos = plano["vendedores_rapidos"].reset_index()
+            vendedores_rapidos.columns = ['Vendedor', 'Tempo Médio']
+            fig3 = px.bar(
+                vendedores_rapidos, x='Tempo Médio', y='Vendedor',
+                orientation='h', title='Top 5 Vendedores Mais Rápidos'
+            )
+            fig3.update_layout(xaxis_title="Tempo Médio (dias)", yaxis_title="ID do Vendedor")
+            return fig3
+        mostrar_grafico("dashboard/vendedores_rapidos", filtros, grafico_vendedores_rapidos)
     with col4:
-        vendedores_lentos = df_filtrado.groupby('seller_id')['tempo_entrega'].mean().nlargest(5).sort_values(ascending=True).reset_index()
-        vendedores_lentos.columns = ['Vendedor', 'Tempo Médio']
-        fig4 = px.bar(
-            vendedores_lentos, x='Tempo Médio', y='Vendedor',
-            orientation='h', title='Top 5 Vendedores Mais Lentos'
-        )
-        fig4.update_layout(xaxis_title="Tempo Médio (dias)", yaxis_title="ID do Vendedor")
-        st.plotly_chart(fig4, use_container_width=True)
+        def grafico_vendedores_lentos():
+            vendedores_lentos = plano["vendedores_lentos"].reset_index()
+            vendedores_lentos.columns = ['Vendedor', 'Tempo Médio']
+            fig4 = px.bar(
+                vendedores_lentos, x='Tempo Médio', y='Vendedor',
+                orientation='h', title='Top 5 Vendedores Mais Lentos'
+            )
+            fig4.update_layout(xaxis_title="Tempo Médio (dias)", yaxis_title="ID do Vendedor")
+            return fig4
+        mostrar_grafico("dashboard/vendedores_lentos", filtros, grafico_vendedores_lentos)
+
+# Com a aba visível já desenhada, as outras abas do mesmo período são calculadas em segundo plano.
+prefetch_abas(selecao_dashboard, versao, start_date, end_date)
+# Uma vez por versão da base: anos, meses e a base inteira são calculados antes de alguém pedir.
+aquecer_periodos(versao)
+
+mostrar_painel()
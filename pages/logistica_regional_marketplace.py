@@ -1,6 +1,16 @@
 import streamlit as st
-import pandas as pd
 import plotly.express as px
+from base_marketplace import versao_atual
+from analise_marketplace import get_periodo_anterior, variacao_absoluta
+from graficos_marketplace import mostrar_grafico
+from indice_marketplace import estados_das_regioes
+from perfil_marketplace import iniciar_rerun, medir, mostrar_painel
+from planos_marketplace import aquecer_periodos
+
+# Regiões analisadas (chaves de REGIOES em indice_marketplace.py) e colunas que a página lê.
+REGIOES_ANALISADAS = ("Norte", "Nordeste")
+COLUNAS_LOGISTICA = ["order_purchase_timestamp", "customer_state", "customer_city", "tempo_entrega", "freight_value", "atraso"]
+nome_regioes = " e ".join(REGIOES_ANALISADAS)
 
 # --- CONFIGURAÇÃO DA PÁGINA ---
 st.set_page_config(
@@ -8,6 +18,7 @@ st.set_page_config(
     layout="wide",
     page_icon=""  # troque se quiser outro favicon!
 )
+iniciar_rerun("Logística N/NE")
 
 
 st.markdown("""
@@ -17,20 +28,11 @@ st.markdown("""
     </style>
 """, unsafe_allow_html=True)
 
-st.title("📦 Logística Detalhada: Marketplace - Norte e Nordeste")
-
-@st.cache_data
-def carregar_dados():
-    df = pd.read_csv(
-        "dataset_olist_final_limpo.csv",
-        parse_dates=["order_purchase_timestamp", "order_delivered_customer_date", "order_estimated_delivery_date"]
-    )
-    df["tempo_entrega"] = (df["order_delivered_customer_date"] - df["order_purchase_timestamp"]).dt.days
-    df["atraso"] = df["order_delivered_customer_date"] > df["order_estimated_delivery_date"]
-    return df
+st.title(f"📦 Logística Detalhada: Marketplace - {nome_regioes}")
 
 try:
-    df_total = carregar_dados()
+    versao = versao_atual()
+    pedidos, indice = versao.pedidos, versao.indice
 except Exception as e:
     st.error(f"Erro ao carregar os dados: {e}")
     st.stop()
@@ -38,35 +40,47 @@ except Exception as e:
 # --- SINCRONIZAÇÃO COM FILTRO DE DATA GLOBAL ---
 if 'date_range' in st.session_state:
     start_date, end_date = st.session_state.date_range
-    df_filtrado_data = df_total[
-        (df_total["order_purchase_timestamp"].dt.date >= start_date) &
-        (df_total["order_purchase_timestamp"].dt.date <= end_date)
-    ]
 else:
     st.warning("Nenhum período selecionado no Dashboard. Analisando o período completo.")
-    start_date = df_total["order_purchase_timestamp"].min().date()
-    end_date = df_total["order_purchase_timestamp"].max().date()
-    df_filtrado_data = df_total
+    start_date, end_date = versao.cubo.periodo_completo()
+
+# O período anterior é contíguo ao atual: a janela de posições cobre os dois e é
+# dividida na primeira posição do período atual.
+inicio_anterior, fim_anterior = get_periodo_anterior(start_date, end_date)
+with medir("filtro/posicoes_periodo"):
+    inicio_janela, fim_janela = pedidos.posicoes_periodo(inicio_anterior, end_date)
+    corte = pedidos.posicoes_periodo(start_date, end_date)[0]
+estados_regiao = estados_das_regioes(REGIOES_ANALISADAS)
+
+
+def selecionar(cidades=()):
+    """(pedidos do período anterior, pedidos do período) da região, via índice de estado/cidade."""
+    with medir("filtro/indice_local"):
+        posicoes = indice.posicoes(estados_regiao, cidades, inicio_janela, fim_janela)
+        divisao = posicoes.searchsorted(corte)
+    with medir("filtro/linhas"):
+        linhas = pedidos.linhas(posicoes, COLUNAS_LOGISTICA)
+    return linhas.iloc[:divisao], linhas.iloc[divisao:]
+
 
 st.markdown("---")
 
-estados_norte_nordeste = [
-    "AC", "AP", "AM", "PA", "RO", "RR", "TO",
-    "AL", "BA", "CE", "MA", "PB", "PE", "PI", "RN", "SE"
-]
-df_filtrado_regiao = df_filtrado_data[df_filtrado_data["customer_state"].isin(estados_norte_nordeste)].copy()
+df_anterior, df_filtrado_regiao = selecionar()
 
 if not df_filtrado_regiao.empty:
     st.subheader("Filtre por Cidade")
-    cidades_disponiveis = sorted(df_filtrado_regiao['customer_city'].unique())
+    # A lista ordenada da região vem pronta do índice; aqui só ficam as cidades com pedidos no período.
+    with medir("agregado/cidades"):
+        cidades_no_periodo = set(df_filtrado_regiao['customer_city'].unique())
+        cidades_disponiveis = [cidade for cidade in indice.cidades_da_regiao(estados_regiao) if cidade in cidades_no_periodo]
     cidades_selecionadas = st.multiselect(
         "Selecione uma ou mais cidades para detalhar a análise:",
         options=cidades_disponiveis,
-        placeholder="Deixe em branco para ver todas as cidades das regiões N/NE"
+        placeholder=f"Deixe em branco para ver todas as cidades das regiões {nome_regioes}"
     )
 
     if cidades_selecionadas:
-        df_filtrado = df_filtrado_regiao[df_filtrado_regiao['customer_city'].isin(cidades_selecionadas)].copy()
+        df_anterior, df_filtrado = selecionar(cidades_selecionadas)
     else:
         df_filtrado = df_filtrado_regiao
 else:
@@ -77,12 +91,14 @@ else:
 cidades_info = ", ".join(cidades_selecionadas) if cidades_selecionadas else "Todas as cidades"
 st.info(
     f"Analisando de **{start_date.strftime('%d/%m/%Y')}** a **{end_date.strftime('%d/%m/%Y')}** | "
-    f"Regiões: **Norte e Nordeste** | Cidades: **{cidades_info}**.",
+    f"Regiões: **{nome_regioes}** | Cidades: **{cidades_info}**.",
     icon="🗺️"
 )
 
 if df_filtrado.empty:
     st.warning("Não há dados para os filtros selecionados.")
+    aquecer_periodos(versao)
+    mostrar_painel()
     st.stop()
 
 st.markdown("---")
@@ -90,26 +106,48 @@ st.markdown("---")
 # KPIs
 st.subheader("Indicadores para a Seleção")
 col1, col2, col3 = st.columns(3)
-col1.metric("⏱️ Tempo médio de entrega", f"{df_filtrado['tempo_entrega'].mean():.1f} dias")
-col2.metric("🚚 Frete médio", f"R$ {df_filtrado['freight_value'].mean():.2f}")
-pct_atraso = df_filtrado["atraso"].mean() * 100
-col3.metric("🔴 Pedidos com Atraso", f"{pct_atraso:.1f}%")
+with medir("agregado/kpis"):
+    tempo_medio, tempo_anterior = df_filtrado['tempo_entrega'].mean(), df_anterior['tempo_entrega'].mean()
+    frete_medio, frete_anterior = df_filtrado['freight_value'].mean(), df_anterior['freight_value'].mean()
+    pct_atraso, pct_atraso_anterior = df_filtrado["atraso"].mean() * 100, df_anterior["atraso"].mean() * 100
+col1.metric("⏱️ Tempo médio de entrega", f"{tempo_medio:.1f} dias",
+            delta=variacao_absoluta(tempo_medio, tempo_anterior, "{:+.1f} dias"), delta_color="inverse")
+col2.metric("🚚 Frete médio", f"R$ {frete_medio:.2f}",
+            delta=variacao_absoluta(frete_medio, frete_anterior, "{:+.2f} R$"), delta_color="inverse")
+col3.metric("🔴 Pedidos com Atraso", f"{pct_atraso:.1f}%",
+            delta=variacao_absoluta(pct_atraso, pct_atraso_anterior, "{:+.1f} p.p."), delta_color="inverse")
+if df_anterior.empty:
+    st.caption("Sem dados no período anterior para comparação.")
+else:
+    st.caption(f"Variações em relação a {inicio_anterior.strftime('%d/%m/%Y')} – {fim_anterior.strftime('%d/%m/%Y')}.")
 
 st.markdown("---")
 
 
 st.subheader("Análise por Estado")
+# Tudo o que muda os gráficos: versão da base, período e cidades.
+filtros = (versao.numero, start_date, end_date, tuple(cidades_selecionadas))
 col_graf1, col_graf2 = st.columns(2)
 with col_graf1:
-    pedidos_estado = df_filtrado["customer_state"].value_counts().reset_index()
-    pedidos_estado.columns = ["Estado", "Pedidos"]
-    fig1 = px.bar(pedidos_estado, x="Pedidos", y="Estado", orientation='h', title="Total de Pedidos por Estado")
-    fig1.update_layout(yaxis={'categoryorder': 'total ascending'})
-    st.plotly_chart(fig1, use_container_width=True)
+    def grafico_pedidos_estado():
+        with medir("agregado/pedidos_estado"):
+            pedidos_estado = df_filtrado["customer_state"].value_counts().loc[lambda s: s > 0].reset_index()
+        pedidos_estado.columns = ["Estado", "Pedidos"]
+        fig1 = px.bar(pedidos_estado, x="Pedidos", y="Estado", orientation='h', title="Total de Pedidos por Estado")
+        fig1.update_layout(yaxis={'categoryorder': 'total ascending'})
+        return fig1
+    mostrar_grafico("logistica/pedidos_estado", filtros, grafico_pedidos_estado)
 
 with col_graf2:
-    frete_estado = df_filtrado.groupby("customer_state")["freight_value"].mean().sort_values().reset_index()
-    frete_estado.columns = ["Estado", "Frete Médio"]
-    fig2 = px.bar(frete_estado, x="Frete Médio", y="Estado", orientation='h', title="Frete Médio por Estado")
-    fig2.update_layout(yaxis={'categoryorder': 'total ascending'}, xaxis_title="Valor (R$)")
-    st.plotly_chart(fig2, use_container_width=True)
+    def grafico_frete_estado():
+        with medir("agregado/frete_estado"):
+            frete_estado = df_filtrado.groupby("customer_state", observed=True)["freight_value"].mean().sort_values().reset_index()
+        frete_estado.columns = ["Estado", "Frete Médio"]
+        fig2 = px.bar(frete_estado, x="Frete Médio", y="Estado", orientation='h', title="Frete Médio por Estado")
+        fig2.update_layout(yaxis={'categoryorder': 'total ascending'}, xaxis_title="Valor (R$)")
+        return fig2
+    mostrar_grafico("logistica/frete_estado", filtros, grafico_frete_estado)
+
+# O dashboard e o bot abrem nos períodos canônicos: eles são calculados em segundo plano.
+aquecer_periodos(versao)
+mostrar_painel()
@@ -0,0 +1,368 @@
+import json
+import os
+import shutil
+from dataclasses import dataclass, field
+from datetime import timedelta
+
+import numpy as np
+import pandas as pd
+import pyarrow.feather as feather
+
+from analise_marketplace import COLUNAS_VENDEDORES, LIMITE_ATRASO_DIAS, somas_vendedores, tabela_de_somas
+from cubo_marketplace import COLUNAS_CUBO, montar_cubo
+from dados_marketplace import (
+    ARQUIVO_CSV, COLUNAS_CATEGORIA, COLUNAS_DATA, compactar_tipos, inicio_do_dia, normalizar_fuso,
+    preparar_dados, snapshot_atualizado,
+)
+
+# --- CONFIGURAÇÃO DO MODO PARTICIONADO ---
+PASTA_PARTICOES = "particoes_olist"
+ARQUIVO_MANIFESTO = "manifesto.json"
+LINHAS_POR_BLOCO = 500_000  # linhas do CSV lidas por vez durante o particionamento
+# Sobe quando muda o que é gravado ao lado de cada mês: partições de um formato anterior são refeitas.
+FORMATO_PARTICOES = 2
+
+
+def mes_local(datas):
+    # "AAAA-MM" da data no fuso local, o mesmo rótulo da coluna ano_mes.
+    return datas.dt.to_period("M").astype(str)
+
+
+def aplicar_categorias(df, categorias):
+    """Põe as colunas categóricas sob as categorias globais da base particionada.
+
+    As categorias de uma partição antiga são sempre um prefixo das globais
+    (lotes novos só acrescentam no fim), então basta comparar o tamanho.
+    """
+    for coluna, valores in categorias.items():
+        if coluna in df and len(df[coluna].cat.categories) != len(valores):
+            df[coluna] = pd.Categorical(df[coluna], categories=valores)
+    return df
+
+
+def raiz(arquivo):
+    return arquivo.removesuffix(".arrow")
+
+
+def arquivo_somas(arquivo, limite_atraso):
+    return f"{raiz(arquivo)}.vendedores_{limite_atraso}.arrow"
+
+
+def par_cidade(estado, cidade):
+    # (estado, cidade) em um inteiro só, a partir dos códigos das categorias globais.
+    return (np.asarray(estado, dtype=np.int64) << 32) | np.asarray(cidade, dtype=np.int64)
+
+
+def gravar_indice_mes(pasta, arquivo, df):
+    """Índice de estado e de (estado, cidade) do mês em vetores .npy, para ser mapeado.
+
+    Os grupos são identificados pelos códigos das categorias globais (lotes só
+    acrescentam categorias no fim, então os códigos não mudam) e guardam as
+    posições dentro da partição, em ordem crescente.
+    """
+    estado = df["customer_state"].cat.codes.to_numpy(dtype=np.int64)
+    cidade = df["customer_city"].cat.codes.to_numpy(dtype=np.int64)
+    posicoes = np.arange(len(df), dtype=np.int32)
+    validos = estado >= 0
+    ordem = np.argsort(estado[validos], kind="stable")
+    estados = estado[validos][ordem]
+    limites = np.searchsorted(estados, np.arange(len(df["customer_state"].cat.categories) + 1))
+    np.save(os.path.join(pasta, f"{raiz(arquivo)}.estados_posicoes.npy"), posicoes[validos][ordem])
+    np.save(os.path.join(pasta, f"{raiz(arquivo)}.estados_limites.npy"), limites.astype(np.int64))
+
+    validos = (estado >= 0) & (cidade >= 0)
+    pares = par_cidade(estado[validos], cidade[validos])
+    ordem = np.argsort(pares, kind="stable")
+    chaves, inicios = np.unique(pares[ordem], return_index=True)
+    np.save(os.path.join(pasta, f"{raiz(arquivo)}.cidades_posicoes.npy"), posicoes[validos][ordem])
+    np.save(os.path.join(pasta, f"{raiz(arquivo)}.cidades_chaves.npy"), chaves)
+    np.save(os.path.join(pasta, f"{raiz(arquivo)}.cidades_limites.npy"), np.append(inicios, len(pares)).astype(np.int64))
+
+
+def gravar_mes(pasta, arquivo, df):
+    """Grava a partição de um mês e, ao lado dela, o índice de estado/cidade e as somas por loja do mês."""
+    df = df.reset_index(drop=True)
+    df.to_feather(os.path.join(pasta, arquivo), compression="uncompressed")
+    gravar_indice_mes(pasta, arquivo, df)
+    somas = somas_vendedores(df, LIMITE_ATRASO_DIAS).reset_index()
+    somas.to_feather(os.path.join(pasta, arquivo_somas(arquivo, LIMITE_ATRASO_DIAS)), compression="uncompressed")
+
+
+def particionar_csv(caminho_csv=ARQUIVO_CSV, pasta=PASTA_PARTICOES, linhas_por_bloco=LINHAS_POR_BLOCO):
+    """Reescreve o CSV como um arquivo Arrow por mês de compra, sem carregar o CSV inteiro.
+
+    Primeiro o CSV é lido em blocos e cada bloco é espalhado em pedaços por
+    mês; depois cada mês é montado, preparado e ordenado sozinho (ver
+    gravar_mes). Só um bloco ou um mês fica na memória por vez. O manifesto é
+    gravado por último.
+    """
+    brutos = os.path.join(pasta, ".brutos")
+    shutil.rmtree(pasta, ignore_errors=True)
+    os.makedirs(brutos)
+    valores = {coluna: set() for coluna in COLUNAS_CATEGORIA}
+    for numero, bloco in enumerate(pd.read_csv(caminho_csv, parse_dates=COLUNAS_DATA, chunksize=linhas_por_bloco)):
+        for coluna in COLUNAS_CATEGORIA:
+            valores[coluna].update(bloco[coluna].dropna().unique())
+        meses = mes_local(normalizar_fuso(bloco["order_purchase_timestamp"]))
+        for mes, pedaco in bloco.groupby(meses.to_numpy()):
+            os.makedirs(os.path.join(brutos, mes), exist_ok=True)
+            pedaco.reset_index(drop=True).to_feather(os.path.join(brutos, mes, f"{numero:05d}.arrow"))
+
+    categorias = {coluna: sorted(nomes) for coluna, nomes in valores.items()}
+    manifesto = {"formato": FORMATO_PARTICOES, "meses": [], "linhas": [], "categorias": categorias}
+    for mes in sorted(os.listdir(brutos)):
+        pasta_mes = os.path.join(brutos, mes)
+        pedacos = [pd.read_feather(os.path.join(pasta_mes, nome)) for nome in sorted(os.listdir(pasta_mes))]
+        df = preparar_dados(aplicar_categorias(compactar_tipos(pd.concat(pedacos, ignore_index=True)), categorias))
+        if len(df):
+            gravar_mes(pasta, f"{mes}.arrow", df)
+            manifesto["meses"].append(mes)
+            manifesto["linhas"].append(len(df))
+        shutil.rmtree(pasta_mes)
+    os.rmdir(brutos)
+    # Cada arquivo tem um mês só; ao ler, ano_mes fica sob a lista de todos os meses, como na base em memória.
+    categorias["ano_mes"] = list(manifesto["meses"])
+
+    temporario = os.path.join(pasta, ARQUIVO_MANIFESTO + ".tmp")
+    with open(temporario, "w", encoding="utf-8") as arquivo:
+        json.dump(manifesto, arquivo, ensure_ascii=False)
+    os.replace(temporario, os.path.join(pasta, ARQUIVO_MANIFESTO))
+    return manifesto
+
+
+@dataclass(frozen=True)
+class PedidosParticionados:
+    """Pedidos guardados em disco, um arquivo Arrow por mês, lidos sob demanda.
+
+    Expõe a mesma interface de PedidosMemoria: as posições são as da base
+    inteira ordenada pela data da compra (a partição k cobre as posições
+    [inicios[k], inicios[k + 1])), mas só as partições que um período ou um
+    conjunto de posições toca são lidas, e só nas colunas pedidas. Cada mês
+    tem ao lado o seu índice de estado/cidade e as somas por loja (gravar_mes).
+    """
+    pasta: str
+    meses: tuple
+    arquivos: tuple
+    inicios: np.ndarray
+    categorias: dict
+
+    def __len__(self):
+        return int(self.inicios[-1])
+
+    def ler(self, k, colunas=None):
+        caminho = os.path.join(self.pasta, self.arquivos[k])
+        tabela = feather.read_table(caminho, columns=None if colunas is None else list(colunas), memory_map=True)
+        df = aplicar_categorias(tabela.to_pandas(), self.categorias)
+        df.index = pd.RangeIndex(self.inicios[k], self.inicios[k + 1])
+        return df
+
+    def posicao(self, dia):
+        """Primeira posição com compra a partir da meia-noite (local) de `dia`."""
+        k = int(np.searchsorted(self.meses, dia.strftime("%Y-%m")))
+        if k == len(self.meses) or self.meses[k] != dia.strftime("%Y-%m"):
+            return int(self.inicios[k])
+        datas = self.ler(k, ["order_purchase_timestamp"])["order_purchase_timestamp"]
+        return int(self.inicios[k] + datas.searchsorted(inicio_do_dia(dia), side="left"))
+
+    def posicoes_periodo(self, data_inicio, data_fim):
+        return self.posicao(data_inicio), self.posicao(data_fim + timedelta(days=1))
+
+    def particoes(self, inicio, fim):
+        """Partições que têm alguma posição em [inicio, fim)."""
+        primeira = max(int(np.searchsorted(self.inicios, inicio, side="right")) - 1, 0)
+        ultima = int(np.searchsorted(self.inicios, fim, side="left"))
+        return range(primeira, min(ultima, len(self.meses)))
+
+    def intervalo(self, inicio, fim, colunas=None):
+        """Linhas das posições [inicio, fim), lendo só as partições que o intervalo cobre."""
+        partes = [
+            self.ler(k, colunas).iloc[max(inicio - self.inicios[k], 0):fim - self.inicios[k]]
+            for k in self.particoes(inicio, fim)
+        ]
+        return self.juntar(partes, colunas)
+
+    def periodo(self, data_inicio, data_fim, colunas=None):
+        return self.intervalo(*self.posicoes_periodo(data_inicio, data_fim), colunas)
+
+    def linhas(self, posicoes, colunas):
+        particao = np.searchsorted(self.inicios, posicoes, side="right") - 1
+        limites = np.flatnonzero(np.diff(particao, prepend=-1))
+        partes = [
+            self.ler(particao[i], colunas).take(grupo - self.inicios[particao[i]])
+            for i, grupo in zip(limites, np.split(posicoes, limites[1:]))
+        ] if len(posicoes) else []
+        return self.juntar(partes, colunas)
+
+    def juntar(self, partes, colunas):
+        if not partes:
+            return self.ler(0, colunas).iloc[:0] if self.meses else pd.DataFrame(columns=colunas)
+        return pd.concat(partes) if len(partes) > 1 else partes[0]
+
+    def ultima_compra(self):
+        if not self.meses:
+            return None
+        return self.ler(len(self.meses) - 1, ["order_purchase_timestamp"])["order_purchase_timestamp"].iloc[-1]
+
+    def vendedores(self, data_inicio, data_fim, limite_atraso):
+        """A tabela de tabela_vendedores: meses inteiros do período vêm das somas gravadas, e só as pontas leem pedidos."""
+        inicio, fim = self.posicoes_periodo(data_inicio, data_fim)
+        partes = []
+        for k in self.particoes(inicio, fim):
+            caminho = os.path.join(self.pasta, arquivo_somas(self.arquivos[k], limite_atraso))
+            if inicio <= self.inicios[k] and self.inicios[k + 1] <= fim and os.path.exists(caminho):
+                partes.append(feather.read_table(caminho, memory_map=True).to_pandas())
+            else:
+                pedidos = self.intervalo(max(inicio, int(self.inicios[k])), min(fim, int(self.inicios[k + 1])), COLUNAS_VENDEDORES)
+                partes.append(somas_vendedores(pedidos, limite_atraso).reset_index())
+        if not partes:
+            return tabela_de_somas(somas_vendedores(self.intervalo(0, 0, COLUNAS_VENDEDORES), limite_atraso))
+        return tabela_de_somas(pd.concat(partes, ignore_index=True).groupby("seller_id").sum())
+
+    def vetor_indice(self, k, nome):
+        return np.load(os.path.join(self.pasta, f"{raiz(self.arquivos[k])}.{nome}.npy"), mmap_mode="r")
+
+    def grupos_mes(self, k, estados, pares=None):
+        """Grupos do mês k dos códigos de estado dados ou, com `pares`, das cidades (ver par_cidade).
+
+        Cada grupo é uma fatia dos vetores mapeados, com as posições da
+        partição em ordem crescente.
+        """
+        if pares is None:
+            limites = self.vetor_indice(k, "estados_limites")
+            posicoes = self.vetor_indice(k, "estados_posicoes")
+            return [posicoes[limites[estado]:limites[estado + 1]] for estado in estados if estado + 1 < len(limites)]
+        chaves = self.vetor_indice(k, "cidades_chaves")
+        limites = self.vetor_indice(k, "cidades_limites")
+        posicoes = self.vetor_indice(k, "cidades_posicoes")
+        achados = np.searchsorted(chaves, pares)
+        return [
+            posicoes[limites[i]:limites[i + 1]]
+            for par, i in zip(pares, achados) if i < len(chaves) and chaves[i] == par
+        ]
+
+    def montar_indice(self):
+        pares = np.unique(np.concatenate([np.empty(0, dtype=np.int64)] + [self.vetor_indice(k, "cidades_chaves") for k in range(len(self.meses))]))
+        estados, cidades = self.categorias["customer_state"], self.categorias["customer_city"]
+        nomes = zip((pares >> 32).tolist(), (pares & 0xFFFFFFFF).tolist())
+        return IndiceParticionado(pedidos=self, cidades=frozenset((estados[e], cidades[c]) for e, c in nomes))
+
+    def anexar(self, novos, numero):
+        """Incorpora pedidos já preparados. Devolve (pedidos novos, lote alinhado, se houve retroativos).
+
+        Só os meses que o lote toca são regravados, em arquivos novos marcados
+        com o número da versão; os arquivos da versão anterior ficam intactos
+        para quem ainda está lendo por ela.
+        """
+        categorias = dict(self.categorias)
+        for coluna in categorias:
+            extras = novos[coluna].cat.categories.difference(categorias[coluna])
+            categorias[coluna] = list(categorias[coluna]) + list(extras)
+        novos = novos.assign(**{coluna: pd.Categorical(novos[coluna], categories=valores) for coluna, valores in categorias.items()})
+        ultima = self.ultima_compra()
+        retroativos = bool(ultima is not None and len(novos) and novos["order_purchase_timestamp"].iloc[0] < ultima)
+
+        arquivos = dict(zip(self.meses, self.arquivos))
+        linhas = dict(zip(self.meses, np.diff(self.inicios).tolist()))
+        for mes, lote in novos.groupby("ano_mes", sort=True):
+            if mes in arquivos:
+                atual = self.ler(self.meses.index(mes))
+                lote = pd.concat([aplicar_categorias(atual, categorias), lote], ignore_index=True)
+                lote = lote.sort_values("order_purchase_timestamp", kind="stable", ignore_index=True)
+            arquivos[mes] = f"{mes}.lote{numero}.arrow"
+            linhas[mes] = len(lote)
+            gravar_mes(self.pasta, arquivos[mes], lote)
+
+        meses = tuple(sorted(arquivos))
+        pedidos = PedidosParticionados(
+            pasta=self.pasta,
+            meses=meses,
+            arquivos=tuple(arquivos[mes] for mes in meses),
+            inicios=np.concatenate([[0], np.cumsum([linhas[mes] for mes in meses])]).astype(np.int64),
+            categorias=categorias,
+        )
+        return pedidos, novos, retroativos
+
+
+@dataclass(frozen=True)
+class IndiceParticionado:
+    """Mesma interface do IndiceLocal, com os grupos de cada mês gravados ao lado da partição.
+
+    Uma consulta mapeia só os índices dos meses que o intervalo de posições
+    toca; na memória ficam apenas os pares (estado, cidade) para os seletores.
+    """
+    pedidos: PedidosParticionados
+    cidades: frozenset
+    _cidades_por_regiao: dict = field(default_factory=dict, compare=False, repr=False)
+
+    def codigos(self, coluna, nomes):
+        posicao = {nome: codigo for codigo, nome in enumerate(self.pedidos.categorias[coluna])}
+        return [posicao[nome] for nome in nomes if nome in posicao]
+
+    def posicoes(self, estados, cidades=(), inicio=0, fim=None):
+        """Posições (crescentes) das linhas dos estados, e das cidades se dadas, dentro de [inicio, fim)."""
+        fim = len(self.pedidos) if fim is None else min(fim, len(self.pedidos))
+        codigos_estados = self.codigos("customer_state", estados)
+        pares = None
+        if cidades:
+            codigos_cidades = self.codigos("customer_city", cidades)
+            pares = par_cidade(np.repeat(codigos_estados, len(codigos_cidades)), np.tile(codigos_cidades, len(codigos_estados)))
+        partes = [np.array([], dtype=np.int64)]
+        for k in self.pedidos.particoes(inicio, fim):
+            deslocamento = int(self.pedidos.inicios[k])
+            recortes = [
+                grupo[grupo.searchsorted(inicio - deslocamento):grupo.searchsorted(fim - deslocamento)]
+                for grupo in self.pedidos.grupos_mes(k, codigos_estados, pares)
+            ]
+            if recortes:
+                partes.append(np.sort(np.concatenate(recortes)).astype(np.int64) + deslocamento)
+        return np.concatenate(partes)
+
+    def cidades_da_regiao(self, estados):
+        """Nomes das cidades dos estados dados, em ordem alfabética; calculado uma vez por região."""
+        chave = tuple(sorted(estados))
+        if chave not in self._cidades_por_regiao:
+            self._cidades_por_regiao[chave] = sorted({cidade for estado, cidade in self.cidades if estado in chave})
+        return self._cidades_por_regiao[chave]
+
+
+def abrir_particoes(pasta=PASTA_PARTICOES, caminho_csv=ARQUIVO_CSV):
+    """PedidosParticionados da pasta, refazendo as partições se o CSV for mais novo que o manifesto."""
+    caminho_manifesto = os.path.join(pasta, ARQUIVO_MANIFESTO)
+    manifesto = None
+    if snapshot_atualizado(caminho_csv, caminho_manifesto):
+        with open(caminho_manifesto, encoding="utf-8") as arquivo:
+            manifesto = json.load(arquivo)
+    if manifesto is None or manifesto.get("formato") != FORMATO_PARTICOES:
+        manifesto = particionar_csv(caminho_csv, pasta)
+    arquivos = {f"{mes}.arrow" for mes in manifesto["meses"]}
+    for nome in os.listdir(pasta):
+        if ".lote" in nome and nome not in arquivos:
+            os.remove(os.path.join(pasta, nome))  # meses regravados por lotes de uma execução anterior
+    return PedidosParticionados(
+        pasta=pasta,
+        meses=tuple(manifesto["meses"]),
+        arquivos=tuple(f"{mes}.arrow" for mes in manifesto["meses"]),
+        inicios=np.concatenate([[0], np.cumsum(manifesto["linhas"])]).astype(np.int64),
+        categorias=manifesto["categorias"],
+    )
+
+
+def carregar_particoes(pasta=PASTA_PARTICOES, caminho_csv=ARQUIVO_CSV):
+    """(pedidos, cubo, índice) sem nunca ter a base inteira na memória.
+
+    Só os agregados do cubo (por dia, dia × estado, dia × categoria) ficam
+    residentes, montados mês a mês; o índice e as somas por loja ficam no
+    disco ao lado de cada mês e são mapeados só nos meses que uma consulta toca.
+    """
+    pedidos = abrir_particoes(pasta, caminho_csv)
+    cubo = None
+    for k in range(len(pedidos.meses)):
+        mes = montar_cubo(pedidos.ler(k, COLUNAS_CUBO))
+        cubo = mes if cubo is None else cubo.anexar(mes)
+    return pedidos, cubo, pedidos.montar_indice()
+
+
+if __name__ == "__main__":
+    # Etapa de ingestão do modo particionado: `python particoes_marketplace.py`.
+    manifesto = particionar_csv()
+    print(f"{sum(manifesto['linhas']):,} pedidos em {len(manifesto['meses'])} partições mensais em {PASTA_PARTICOES}/")
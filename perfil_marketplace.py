@@ -0,0 +1,168 @@
+# Perfil dos reruns: tempos de carga, filtros, agregados e gráficos, mais os
+# acertos e falhas dos caches de dados. Desligado por padrão:
+#   MARKETPLACE_PERFIL=1 streamlit run botdash_marketplace.py
+#     mostra na barra lateral o painel "Tempos do rerun".
+#   MARKETPLACE_PERFIL_LOG=perfil.jsonl streamlit run botdash_marketplace.py
+#     também grava cada etapa no arquivo (uma linha JSON por etapa);
+#     `python perfil_marketplace.py perfil.jsonl` resume p50/p95 por etapa.
+import json
+import os
+import sys
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+
+import pandas as pd
+import streamlit as st
+
+# --- CONFIGURAÇÃO DO PERFIL ---
+ARQUIVO_LOG_PERFIL = os.environ.get("MARKETPLACE_PERFIL_LOG", "")
+PERFIL_ATIVO = os.environ.get("MARKETPLACE_PERFIL", "0") not in ("", "0") or bool(ARQUIVO_LOG_PERFIL)
+
+_local = threading.local()  # o rerun em andamento em cada thread de script
+_trava_log = threading.Lock()
+_trava_totais = threading.Lock()
+TOTAIS_CACHE = {}  # {cache: [acertos, falhas]} desde o início do processo
+
+
+def _estado():
+    if not hasattr(_local, "spans"):
+        # Threads de segundo plano (prefetch, atualização da base) não pertencem a um rerun:
+        # suas etapas vão só para o log.
+        _local.pagina, _local.rerun, _local.inicio = "segundo plano", None, time.perf_counter()
+        _local.spans, _local.nivel, _local.caches, _local.calculos = [], 0, {}, {}
+    return _local
+
+
+def iniciar_rerun(pagina):
+    """Zera as etapas da thread: tudo o que for medido daqui em diante pertence a este rerun da página."""
+    if not PERFIL_ATIVO:
+        return
+    _local.pagina, _local.rerun, _local.inicio = pagina, uuid.uuid4().hex[:12], time.perf_counter()
+    _local.spans, _local.nivel, _local.caches, _local.calculos = [], 0, {}, {}
+
+
+def gravar(registro):
+    if not ARQUIVO_LOG_PERFIL:
+        return
+    linha = json.dumps(registro, ensure_ascii=False) + "\n"
+    with _trava_log, open(ARQUIVO_LOG_PERFIL, "a", encoding="utf-8") as arquivo:
+        arquivo.write(linha)
+
+
+class Etapa:
+    """Cronometra um bloco `with` e o registra no rerun da thread (e no log, se houver)."""
+
+    def __init__(self, nome):
+        self.nome = nome
+
+    def __enter__(self):
+        estado = _estado()
+        self.nivel = estado.nivel
+        estado.nivel += 1
+        self.inicio = time.perf_counter()
+        return self
+
+    def __exit__(self, *erro):
+        fim = time.perf_counter()
+        estado = _estado()
+        estado.nivel = self.nivel
+        ms = (fim - self.inicio) * 1000
+        estado.spans.append((self.nome, self.nivel, (self.inicio - estado.inicio) * 1000, ms))
+        gravar({"ts": time.time(), "pagina": estado.pagina, "rerun": estado.rerun, "etapa": self.nome, "ms": round(ms, 3)})
+        return False
+
+
+class _EtapaNula:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *erro):
+        return False
+
+
+ETAPA_NULA = _EtapaNula()
+
+
+def medir(nome):
+    """`with medir("filtro/periodo"): ...` — não custa nada com o perfil desligado."""
+    return Etapa(nome) if PERFIL_ATIVO else ETAPA_NULA
+
+
+def contar_cache(cache, acerto):
+    if not PERFIL_ATIVO:
+        return
+    contagem = _estado().caches.setdefault(cache, [0, 0])
+    contagem[0 if acerto else 1] += 1
+    with _trava_totais:
+        TOTAIS_CACHE.setdefault(cache, [0, 0])[0 if acerto else 1] += 1
+
+
+def calculou(cache):
+    """Chamado dentro de uma função memoizada: o corpo só roda quando o cache falha."""
+    if PERFIL_ATIVO:
+        calculos = _estado().calculos
+        calculos[cache] = calculos.get(cache, 0) + 1
+
+
+@contextmanager
+def medir_cache(cache, nome=None):
+    """Etapa de uma chamada a uma função st.cache_data; é acerto se o corpo (com `calculou`) não rodou."""
+    if not PERFIL_ATIVO:
+        yield
+        return
+    calculos = _estado().calculos
+    antes = calculos.get(cache, 0)
+    with Etapa(nome or cache):
+        yield
+    contar_cache(cache, acerto=calculos.get(cache, 0) == antes)
+
+
+# --- PAINEL DA BARRA LATERAL ---
+def mostrar_painel():
+    """Quebra do rerun por etapa e contadores dos caches; chame no fim da página."""
+    if not PERFIL_ATIVO:
+        return
+    estado = _estado()
+    total = (time.perf_counter() - estado.inicio) * 1000
+    gravar({"ts": time.time(), "pagina": estado.pagina, "rerun": estado.rerun, "etapa": "rerun", "ms": round(total, 3)})
+    st.sidebar.markdown("---")
+    if not st.sidebar.toggle("⏱️ Tempos do rerun", key="_perfil_painel"):
+        return
+    st.sidebar.caption(f"**{estado.pagina}**: {total:,.1f} ms no total.")
+    etapas = pd.DataFrame(
+        [(" " * nivel + nome, inicio, ms, ms / total if total else 0.0) for nome, nivel, inicio, ms in sorted(estado.spans, key=lambda s: s[2])],
+        columns=["Etapa", "Início (ms)", "Duração (ms)", "% do rerun"],
+    )
+    st.sidebar.dataframe(
+        etapas, hide_index=True, use_container_width=True,
+        column_config={
+            "Início (ms)": st.column_config.NumberColumn(format="%.1f"),
+            "Duração (ms)": st.column_config.NumberColumn(format="%.1f"),
+            "% do rerun": st.column_config.ProgressColumn(format="percent", min_value=0.0, max_value=1.0),
+        },
+    )
+    with _trava_totais:
+        totais = {cache: tuple(contagem) for cache, contagem in TOTAIS_CACHE.items()}
+    caches = pd.DataFrame(
+        [(cache, *estado.caches.get(cache, (0, 0)), *totais[cache]) for cache in sorted(totais)],
+        columns=["Cache", "Acertos", "Falhas", "Acertos (processo)", "Falhas (processo)"],
+    )
+    st.sidebar.dataframe(caches, hide_index=True, use_container_width=True)
+
+
+def resumir_log(caminho=ARQUIVO_LOG_PERFIL):
+    """p50, p95 e máximo (ms) de cada etapa registrada no log, de todas as sessões."""
+    registros = pd.read_json(caminho, lines=True)
+    registros = registros[registros["ms"].notna()]  # falhas registradas sem tempo (ex.: aquecimento) ficam de fora
+    resumo = registros.groupby(["pagina", "etapa"])["ms"].describe(percentiles=[0.5, 0.95])
+    resumo = resumo.rename(columns={"count": "n", "50%": "p50", "95%": "p95", "max": "máx"})[["n", "p50", "p95", "máx"]]
+    resumo["n"] = resumo["n"].astype(int)
+    return resumo.sort_values("p95", ascending=False)
+
+
+if __name__ == "__main__":
+    # `python perfil_marketplace.py [arquivo.jsonl]`
+    with pd.option_context("display.max_rows", None, "display.max_columns", None, "display.width", 160, "display.float_format", "{:,.1f}".format):
+        print(resumir_log(sys.argv[1] if len(sys.argv) > 1 else ARQUIVO_LOG_PERFIL or "perfil.jsonl"))
@@ -0,0 +1,204 @@
+import logging
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from datetime import date
+
+import streamlit as st
+from dateutil.relativedelta import relativedelta
+from streamlit.runtime.scriptrunner import add_script_run_ctx, get_script_run_ctx
+
+from analise_marketplace import get_periodo_anterior, vendedores_periodo
+from perfil_marketplace import gravar, medir
+from resultados_marketplace import memoizar
+
+
+# --- PLANOS DE CONSULTA DAS ABAS DO DASHBOARD ---
+@dataclass(frozen=True)
+class PlanoAba:
+    """O que uma aba precisa: as colunas dos pedidos que ela lê e os agregados que exibe.
+
+    Nada roda quando o plano é declarado. Cada agregado é uma função que
+    recebe a Consulta do período; os pedidos só são fatiados quando algum
+    agregado pede por eles, e apenas nas colunas declaradas. A tabela de
+    lojas (`Consulta.vendedores`) não passa por aqui: ela é a mesma do bot e
+    lê as próprias colunas (COLUNAS_VENDEDORES).
+    """
+    agregados: dict
+    colunas: tuple = ()
+
+
+@dataclass(frozen=True)
+class Consulta:
+    versao: object
+    data_inicio: object
+    data_fim: object
+    colunas: tuple
+    clientes_exatos: bool = False
+
+    @property
+    def cubo(self):
+        return self.versao.cubo
+
+    def pedidos(self, data_inicio, data_fim):
+        # Em memória, fatia posicional sem cópia (copy-on-write); particionado, só os meses do período.
+        with medir("filtro/periodo"):
+            return self.versao.pedidos.periodo(data_inicio, data_fim, self.colunas)
+
+    def vendedores(self):
+        return vendedores_periodo(self.versao, self.data_inicio, self.data_fim)
+
+
+def kpis_periodo(consulta, data_inicio, data_fim):
+    # Os pedidos só são lidos quando o cubo não conta clientes distintos exatamente (no SQL, já conta).
+    precisa_pedidos = consulta.clientes_exatos and not consulta.cubo.distintos_exatos
+    df_periodo = consulta.pedidos(data_inicio, data_fim) if precisa_pedidos else None
+    return consulta.cubo.kpis(data_inicio, data_fim, df_periodo=df_periodo)
+
+
+def kpis_anteriores(consulta):
+    # O período anterior sai dos mesmos totais diários do cubo, sem nova varredura dos pedidos.
+    anterior = kpis_periodo(consulta, *get_periodo_anterior(consulta.data_inicio, consulta.data_fim))
+    return anterior if anterior["pedidos"] else dict.fromkeys(anterior)
+
+
+PLANOS = {
+    "Visão Geral": PlanoAba(
+        colunas=("customer_id",),  # só com a contagem exata de clientes
+        agregados={
+            "kpis": lambda c: kpis_periodo(c, c.data_inicio, c.data_fim),
+            "kpis_anteriores": kpis_anteriores,
+            "serie_mensal": lambda c: c.cubo.serie_mensal(c.data_inicio, c.data_fim),
+            "top_categorias": lambda c: c.cubo.pedidos_por(c.data_inicio, c.data_fim, "product_category_name_english").nlargest(10),
+            "pedidos_estado": lambda c: c.cubo.pedidos_por(c.data_inicio, c.data_fim, "customer_state"),
+        },
+    ),
+    "Análise de Lojas": PlanoAba(
+        agregados={
+            "top_lojas": lambda c: c.vendedores()["pedidos"].nlargest(10),
+            "top_ticket": lambda c: c.vendedores()["ticket_medio"].nlargest(10),
+            "top_avaliacao": lambda c: c.vendedores()["nota_media"].nlargest(10),
+        },
+    ),
+    "Análise de Logística": PlanoAba(
+        agregados={
+            "tempo_estado": lambda c: c.cubo.media_por(c.data_inicio, c.data_fim, "customer_state", "tempo").sort_values(),
+            "frete_estado": lambda c: c.cubo.media_por(c.data_inicio, c.data_fim, "customer_state", "frete").sort_values(),
+            "vendedores_rapidos": lambda c: c.vendedores()["tempo_medio"].nsmallest(5).sort_values(ascending=False),
+            "vendedores_lentos": lambda c: c.vendedores()["tempo_medio"].nlargest(5).sort_values(ascending=True),
+        },
+    ),
+}
+
+
+def executar_plano(aba, versao, data_inicio, data_fim, clientes_exatos=False):
+    """Roda todos os agregados do plano de uma aba."""
+    plano = PLANOS[aba]
+    consulta = Consulta(versao, data_inicio, data_fim, plano.colunas, clientes_exatos)
+    resultados = {}
+    for nome, agregado in plano.agregados.items():
+        with medir(f"agregado/{nome}"):
+            resultados[nome] = agregado(consulta)
+    return resultados
+
+
+def resultados_aba(aba, versao, data_inicio, data_fim, clientes_exatos=False):
+    # Memoizado por versão, período e opções no cache de resultados do processo.
+    # Num cubo exato a opção não muda nada: as duas chamadas caem na mesma entrada (e no aquecimento).
+    clientes_exatos = clientes_exatos and not versao.cubo.distintos_exatos
+    with medir(f"plano/{aba}"):
+        return memoizar(
+            ("executar_plano", versao.numero, aba, data_inicio, data_fim, clientes_exatos),
+            lambda: executar_plano(aba, versao, data_inicio, data_fim, clientes_exatos),
+        )
+
+
+def prefetch_abas(aba_visivel, versao, data_inicio, data_fim):
+    """Depois que a aba visível foi desenhada, adianta em segundo plano os planos das outras.
+
+    Só dispara uma vez por sessão para cada combinação de versão e período,
+    então trocar de aba ou marcar opções não dispara outra thread.
+    """
+    chave = (versao.numero, data_inicio, data_fim)
+    if st.session_state.get("_prefetch_abas") == chave:
+        return
+    st.session_state["_prefetch_abas"] = chave
+    outras = [aba for aba in PLANOS if aba != aba_visivel]
+
+    def adiantar():
+        for aba in outras:
+            resultados_aba(aba, versao, data_inicio, data_fim)
+
+    tarefa = threading.Thread(target=adiantar, daemon=True)
+    add_script_run_ctx(tarefa)  # sem o contexto da sessão o cache do Streamlit avisa a cada chamada
+    tarefa.start()
+
+
+# --- AQUECIMENTO DOS PERÍODOS CANÔNICOS ---
+THREADS_AQUECIMENTO = int(os.environ.get("MARKETPLACE_THREADS_AQUECIMENTO", "2"))  # 0 desliga o aquecimento
+_versoes_aquecidas = set()
+_trava_aquecimento = threading.Lock()
+registro = logging.getLogger(__name__)
+
+
+def periodos_canonicos(versao):
+    """Os períodos que as páginas abrem sem o usuário escolher datas.
+
+    A base inteira (padrão do dashboard) e cada ano e cada mês com dados
+    (os seletores do bot), dos mais recentes para os mais antigos.
+    """
+    primeiro, ultimo = versao.cubo.periodo_completo()
+    anos = range(ultimo.year, primeiro.year - 1, -1)
+    periodos = [(primeiro, ultimo)] + [(date(ano, 1, 1), date(ano, 12, 31)) for ano in anos]
+    for ano in anos:
+        for mes in range(12, 0, -1):
+            inicio = date(ano, mes, 1)
+            fim = inicio + relativedelta(months=1) - relativedelta(days=1)
+            if inicio <= ultimo and fim >= primeiro:
+                periodos.append((inicio, fim))
+    return periodos
+
+
+def aquecer_periodo(versao, data_inicio, data_fim):
+    for aba in PLANOS:
+        resultados_aba(aba, versao, data_inicio, data_fim)
+    # O bot também compara com o período anterior.
+    vendedores_periodo(versao, *get_periodo_anterior(data_inicio, data_fim))
+
+
+def avisar_falha(futuro, data_inicio, data_fim):
+    """Ninguém espera pelo aquecimento: uma falha só aparece se for registrada aqui."""
+    if futuro.cancelled() or futuro.exception() is None:
+        return
+    erro = futuro.exception()
+    registro.error("Aquecimento do período %s a %s falhou", data_inicio, data_fim, exc_info=erro)
+    gravar({
+        "ts": time.time(), "pagina": "segundo plano", "rerun": None, "etapa": "aquecimento/falha",
+        "periodo": [str(data_inicio), str(data_fim)], "erro": repr(erro),
+    })
+
+
+def aquecer_periodos(versao):
+    """Calcula em segundo plano os planos e as tabelas de lojas dos períodos canônicos.
+
+    Roda uma vez por versão da base em cada processo, num pool de threads, e
+    não espera nada: a página segue e as primeiras interações já encontram os
+    resultados no cache (ou esperam o cálculo em andamento, sem refazê-lo).
+    """
+    with _trava_aquecimento:
+        if THREADS_AQUECIMENTO <= 0 or versao.numero in _versoes_aquecidas:
+            return
+        _versoes_aquecidas.add(versao.numero)
+    contexto = get_script_run_ctx()
+    pool = ThreadPoolExecutor(
+        max_workers=THREADS_AQUECIMENTO,
+        thread_name_prefix="aquecimento",
+        # Com o contexto da sessão o cache do Streamlit (usado pelo backend SQL) não avisa a cada chamada.
+        initializer=lambda: add_script_run_ctx(threading.current_thread(), contexto),
+    )
+    for data_inicio, data_fim in periodos_canonicos(versao):
+        futuro = pool.submit(aquecer_periodo, versao, data_inicio, data_fim)
+        futuro.add_done_callback(lambda f, i=data_inicio, d=data_fim: avisar_falha(f, i, d))
+    pool.shutdown(wait=False)
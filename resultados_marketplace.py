@@ -0,0 +1,108 @@
+import os
+import sys
+import threading
+from collections import OrderedDict
+from concurrent.futures import Future
+
+import numpy as np
+import pandas as pd
+import streamlit as st
+
+from perfil_marketplace import contar_cache
+
+# --- CACHE DE RESULTADOS ---
+LIMITE_RESULTADOS_MB = float(os.environ.get("MARKETPLACE_CACHE_RESULTADOS_MB", "256"))
+
+
+def bytes_coluna(serie):
+    # Categóricas: as categorias são as da base, compartilhadas por todos os resultados; só os códigos contam.
+    if isinstance(serie.dtype, pd.CategoricalDtype):
+        return int(serie.cat.codes.nbytes)
+    return int(serie.memory_usage(index=False, deep=True))
+
+
+def bytes_resultado(valor):
+    """Memória aproximada de um resultado (DataFrame, Series, arrays e dicts/listas deles)."""
+    if isinstance(valor, pd.DataFrame):
+        return bytes_resultado(valor.index) + sum(bytes_coluna(coluna) for _, coluna in valor.items())
+    if isinstance(valor, pd.Series):
+        return bytes_coluna(valor) + bytes_resultado(valor.index)
+    if isinstance(valor, pd.Index):
+        return int(valor.codes.nbytes if isinstance(valor, pd.CategoricalIndex) else valor.memory_usage(deep=True))
+    if isinstance(valor, np.ndarray):
+        return int(valor.nbytes)
+    if isinstance(valor, dict):
+        return sum(bytes_resultado(item) for item in valor.values())
+    if isinstance(valor, (list, tuple)):
+        return sum(bytes_resultado(item) for item in valor)
+    return sys.getsizeof(valor)
+
+
+class CacheResultados:
+    """LRU de tabelas e agregados prontos, compartilhado por todas as sessões do processo.
+
+    O limite é de memória, não de entradas: uma tabela de lojas da base
+    inteira pesa muito mais que os KPIs de um mês. A chave começa pelo nome
+    do resultado (que identifica o cache no perfil). Se duas threads pedem a
+    mesma chave ao mesmo tempo, a segunda espera o cálculo da primeira.
+    Os resultados são devolvidos sem cópia: trate-os como somente leitura.
+    """
+
+    def __init__(self, limite_bytes=LIMITE_RESULTADOS_MB * 2**20):
+        self.limite_bytes = limite_bytes
+        self.ocupado = 0
+        self._resultados = OrderedDict()  # chave -> (resultado, bytes)
+        self._calculando = {}  # chave -> Future de quem está calculando
+        self._trava = threading.Lock()
+
+    def __len__(self):
+        return len(self._resultados)
+
+    def obter(self, chave, calcular):
+        with self._trava:
+            guardado = self._resultados.get(chave)
+            if guardado is not None:
+                self._resultados.move_to_end(chave)
+            else:
+                futuro = self._calculando.get(chave)
+                dono = futuro is None
+                if dono:
+                    futuro = self._calculando[chave] = Future()
+        contar_cache(chave[0], acerto=guardado is not None or not dono)
+        if guardado is not None:
+            return guardado[0]
+        if not dono:
+            return futuro.result()
+        try:
+            resultado = calcular()
+        except BaseException as erro:
+            with self._trava:
+                del self._calculando[chave]
+            futuro.set_exception(erro)
+            raise
+        tamanho = bytes_resultado(resultado)
+        with self._trava:
+            del self._calculando[chave]
+            if tamanho <= self.limite_bytes:
+                self._resultados[chave] = (resultado, tamanho)
+                self.ocupado += tamanho
+                while self.ocupado > self.limite_bytes:
+                    _, (_, liberado) = self._resultados.popitem(last=False)
+                    self.ocupado -= liberado
+        futuro.set_result(resultado)
+        return resultado
+
+    def limpar(self):
+        with self._trava:
+            self._resultados.clear()
+            self.ocupado = 0
+
+
+@st.cache_resource
+def carregar_cache_resultados():
+    return CacheResultados()
+
+
+def memoizar(chave, calcular):
+    """Resultado de `calcular()` pelo cache de resultados; `chave` deve identificar tudo o que o muda."""
+    return carregar_cache_resultados().obter(chave, calcular)
@@ -0,0 +1,407 @@
+import os
+import sqlite3
+import uuid
+from contextlib import closing
+from dataclasses import dataclass
+from datetime import timedelta
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import streamlit as st
+
+from dados_marketplace import (
+    ARQUIVO_CSV, COLUNAS_DATA, FUSO_HORARIO, compactar_tipos, inicio_do_dia, ler_lotes, preparar_dados,
+    snapshot_atualizado,
+)
+from perfil_marketplace import calculou, medir_cache
+
+# --- CONFIGURAÇÃO DO BACKEND SQL ---
+ARQUIVO_BANCO = "dataset_olist_final_limpo.sqlite"
+LINHAS_POR_BLOCO = 500_000  # linhas do CSV lidas por vez ao montar o banco
+MAXIMO_PARAMETROS = 30_000  # abaixo do limite de variáveis por comando do SQLite
+# Índices de cada tabela de pedidos (a posição é a chave primária, então já está em todos).
+INDICES = {
+    "data": ("order_purchase_timestamp",),
+    "loja": ("seller_id",),
+    "local": ("customer_state", "customer_city"),
+}
+# Nome da medida no cubo -> coluna do banco.
+MEDIDAS_SQL = {"valor": "payment_value", "tempo": "tempo_entrega", "nota": "review_score", "frete": "freight_value"}
+
+
+# --- CONVERSÃO ENTRE DATAFRAME E BANCO ---
+def para_banco(df):
+    """Datas viram nanossegundos UTC (INTEGER) e nulos viram None, no formato que o sqlite3 aceita."""
+    df = df.copy()
+    for coluna in COLUNAS_DATA:
+        if coluna in df:
+            datas = df[coluna]
+            df[coluna] = pd.Series(datas.dt.as_unit("ns").array.asi8, index=df.index).astype("Int64").mask(datas.isna())
+    return df.astype(object).where(df.notna(), None)
+
+
+def do_banco(df):
+    """Inverso de para_banco: datas no fuso local, atraso booleano e os mesmos tipos compactos da base em memória."""
+    for coluna in df:
+        serie = df[coluna]
+        if coluna in COLUNAS_DATA:
+            df[coluna] = pd.to_datetime(serie, unit="ns", utc=True).dt.tz_convert(FUSO_HORARIO)
+        elif coluna == "atraso":
+            df[coluna] = serie.astype(bool)
+        elif pd.api.types.is_integer_dtype(serie) and not serie.hasnans:
+            df[coluna] = serie.astype(np.int64)
+        elif pd.api.types.is_numeric_dtype(serie):
+            df[coluna] = serie.to_numpy(dtype=np.float64, na_value=np.nan)
+        else:
+            df[coluna] = serie.astype(object).where(serie.notna(), None)
+    return compactar_tipos(df)
+
+
+def tipo_sql(serie):
+    if pd.api.types.is_bool_dtype(serie) or pd.api.types.is_integer_dtype(serie) or isinstance(serie.dtype, pd.DatetimeTZDtype):
+        return "INTEGER"
+    if pd.api.types.is_float_dtype(serie):
+        return "REAL"
+    return "TEXT"
+
+
+def criar_tabela(con, tabela, df):
+    definicoes = ", ".join(f'"{coluna}" {tipo_sql(df[coluna])}' for coluna in df)
+    con.execute(f"CREATE TABLE {tabela} ({definicoes})")
+
+
+def inserir(con, tabela, df):
+    colunas = ", ".join(f'"{coluna}"' for coluna in df)
+    marcadores = ", ".join("?" * len(df.columns))
+    con.executemany(f"INSERT INTO {tabela} ({colunas}) VALUES ({marcadores})", para_banco(df).itertuples(index=False, name=None))
+
+
+def ordenar_tabela(con, origem, destino):
+    """Cria `destino` com as linhas de `origem` (consulta com a coluna _ordem) ordenadas pela data da compra.
+
+    A posição de cada pedido na ordem cronológica vira a chave primária, então
+    um período é um intervalo de posições, como na base em memória. No empate,
+    vale _ordem, o que mantém a ordem estável da ordenação do pandas.
+    """
+    colunas = [nome for nome, *_ in con.execute(f"SELECT * FROM ({origem}) LIMIT 0").description if nome != "_ordem"]
+    lista = ", ".join(f'"{coluna}"' for coluna in colunas)
+    con.execute(f"CREATE TABLE {destino} (posicao INTEGER PRIMARY KEY, {lista})")
+    con.execute(
+        f"INSERT INTO {destino} (posicao, {lista}) "
+        f"SELECT row_number() OVER (ORDER BY order_purchase_timestamp, _ordem) - 1, {lista} FROM ({origem})"
+    )
+    for nome, indexadas in INDICES.items():
+        con.execute(f"CREATE INDEX {destino}_{nome} ON {destino} ({', '.join(indexadas)})")
+    return con.execute(f"SELECT COUNT(*) FROM {destino}").fetchone()[0]
+
+
+def gerar_banco(caminho_csv=ARQUIVO_CSV, caminho_banco=ARQUIVO_BANCO, linhas_por_bloco=LINHAS_POR_BLOCO):
+    """Monta o banco a partir do CSV em blocos e só então substitui o arquivo anterior."""
+    temporario = f"{caminho_banco}.{os.getpid()}.tmp"
+    if os.path.exists(temporario):
+        os.remove(temporario)
+    with closing(sqlite3.connect(temporario, isolation_level=None)) as con:
+        con.execute("BEGIN")
+        criada = False
+        for bloco in pd.read_csv(caminho_csv, parse_dates=COLUNAS_DATA, chunksize=linhas_por_bloco):
+            bloco = preparar_dados(bloco)
+            if not criada:
+                criar_tabela(con, "carga", bloco)
+                criada = True
+            inserir(con, "carga", bloco)
+        linhas = ordenar_tabela(con, "SELECT *, rowid AS _ordem FROM carga", "pedidos_0")
+        con.execute("DROP TABLE carga")
+        con.execute("CREATE TABLE estado (geracao TEXT, tabela TEXT, linhas INTEGER)")
+        con.execute("INSERT INTO estado VALUES (?, 'pedidos_0', ?)", (uuid.uuid4().hex, linhas))
+        con.execute("CREATE TABLE lotes (nome TEXT PRIMARY KEY)")
+        con.execute("COMMIT")
+        con.execute("VACUUM")  # devolve as páginas da tabela de carga
+        # WAL fica gravado no arquivo: as réplicas (mode=ro) seguem lendo enquanto incorporar_lotes escreve.
+        con.execute("PRAGMA journal_mode=WAL")
+    os.replace(temporario, caminho_banco)
+
+
+def abrir_banco(caminho_csv=ARQUIVO_CSV, caminho_banco=ARQUIVO_BANCO):
+    # Como o snapshot Arrow: o banco é refeito quando o CSV é mais novo que ele.
+    if not snapshot_atualizado(caminho_csv, caminho_banco):
+        gerar_banco(caminho_csv, caminho_banco)
+
+
+def incorporar_lotes(caminho_banco, pasta, nomes):
+    """Grava no banco os lotes de `nomes` que nenhuma réplica gravou ainda.
+
+    Tudo roda em uma transação exclusiva e a tabela `lotes` registra o que já
+    entrou, então várias réplicas olhando a mesma pasta não duplicam pedidos.
+    Lotes no fim da base são só acrescentados; com pedidos retroativos a
+    tabela é reordenada em uma tabela nova, e a anterior continua disponível
+    para quem ainda lê a versão antiga. Devolve os lotes rejeitados por não
+    poderem ser lidos; eles não são registrados na tabela `lotes`.
+    """
+    if not nomes:
+        return []
+    with closing(sqlite3.connect(caminho_banco, isolation_level=None, timeout=60)) as con:
+        con.execute("BEGIN IMMEDIATE")
+        try:
+            gravados = {nome for (nome,) in con.execute("SELECT nome FROM lotes")}
+            pendentes = [nome for nome in nomes if nome not in gravados]
+            if not pendentes:
+                con.execute("ROLLBACK")
+                return []
+            novos, pendentes, rejeitados = ler_lotes(pasta, pendentes)
+            if not pendentes:
+                con.execute("ROLLBACK")
+                return rejeitados
+            _, tabela, linhas = con.execute("SELECT geracao, tabela, linhas FROM estado").fetchone()
+            if len(novos):
+                ultima = con.execute(f"SELECT MAX(order_purchase_timestamp) FROM {tabela}").fetchone()[0]
+                if ultima is None or novos["order_purchase_timestamp"].iloc[0].value >= ultima:
+                    inserir(con, tabela, novos.assign(posicao=np.arange(linhas, linhas + len(novos))))
+                    linhas += len(novos)
+                else:
+                    geracao_tabela = int(tabela.rsplit("_", 1)[1])
+                    criar_tabela(con, "carga", novos)
+                    inserir(con, "carga", novos)
+                    colunas = ", ".join(f'"{coluna}"' for coluna in novos)
+                    tabela = f"pedidos_{geracao_tabela + 1}"
+                    linhas = ordenar_tabela(
+                        con,
+                        f"SELECT {colunas}, posicao AS _ordem FROM pedidos_{geracao_tabela} "
+                        f"UNION ALL SELECT {colunas}, {linhas} + rowid AS _ordem FROM carga",
+                        tabela,
+                    )
+                    con.execute("DROP TABLE carga")
+                    if geracao_tabela:
+                        con.execute(f"DROP TABLE IF EXISTS pedidos_{geracao_tabela - 1}")
+            con.execute("UPDATE estado SET tabela = ?, linhas = ?", (tabela, linhas))
+            con.executemany("INSERT INTO lotes VALUES (?)", [(nome,) for nome in pendentes])
+            con.execute("COMMIT")
+            return rejeitados
+        except BaseException:
+            con.execute("ROLLBACK")
+            raise
+
+
+# --- CONSULTAS ---
+@dataclass(frozen=True)
+class FonteSQL:
+    """Uma versão dos dados no banco: a tabela de pedidos em uso e quantas linhas dela valem.
+
+    Toda consulta se limita às posições [0, linhas), então lotes acrescentados
+    depois não aparecem para quem ainda está lendo uma versão anterior.
+    """
+    caminho: str
+    geracao: str
+    tabela: str
+    linhas: int
+
+
+def ler_fonte(caminho_banco=ARQUIVO_BANCO):
+    with closing(conectar(caminho_banco)) as con:
+        geracao, tabela, linhas = con.execute("SELECT geracao, tabela, linhas FROM estado").fetchone()
+    return FonteSQL(os.path.abspath(caminho_banco), geracao, tabela, linhas)
+
+
+def lotes_gravados(caminho_banco=ARQUIVO_BANCO):
+    with closing(conectar(caminho_banco)) as con:
+        return frozenset(nome for (nome,) in con.execute("SELECT nome FROM lotes"))
+
+
+def conectar(caminho):
+    # Somente leitura: as réplicas só escrevem ao incorporar lotes, em incorporar_lotes.
+    return sqlite3.connect(f"{Path(caminho).absolute().as_uri()}?mode=ro", uri=True, check_same_thread=False)
+
+
+def ler(fonte, sql, parametros=()):
+    with closing(conectar(fonte.caminho)) as con:
+        return pd.read_sql_query(sql.format(tabela=fonte.tabela), con, params=parametros, dtype_backend="numpy_nullable")
+
+
+@st.cache_data(max_entries=256, show_spinner=False)
+def consultar_banco(fonte, sql, parametros=()):
+    """Resultado de uma consulta de agregação, memoizado por versão do banco, consulta e filtros."""
+    calculou("consultar")
+    return ler(fonte, sql, parametros)
+
+
+def consultar(fonte, sql, parametros=()):
+    with medir_cache("consultar", "sql/consultar"):
+        return consultar_banco(fonte, sql, parametros)
+
+
+def por_posicao(df):
+    # A posição vira o índice, como nas fatias da base em memória.
+    df.index = df.pop("posicao").to_numpy(dtype=np.int64)
+    return df
+
+
+def marcadores(valores):
+    return ", ".join("?" * len(valores))
+
+
+def colunas_sql(colunas):
+    return ", ".join(f'"{coluna}"' for coluna in colunas)
+
+
+@dataclass(frozen=True)
+class PedidosSQL:
+    """Pedidos lidos do banco sob demanda, com a interface de PedidosMemoria.
+
+    As posições são a chave primária da tabela (a ordem cronológica), então
+    um período vira um intervalo da chave e as linhas só saem do banco para
+    as posições pedidas.
+    """
+    fonte: FonteSQL
+
+    def __len__(self):
+        return self.fonte.linhas
+
+    def posicao(self, dia):
+        """Primeira posição com compra a partir da meia-noite (local) de `dia`."""
+        resultado = consultar(
+            self.fonte,
+            "SELECT posicao FROM {tabela} WHERE order_purchase_timestamp >= ? ORDER BY order_purchase_timestamp, posicao LIMIT 1",
+            (inicio_do_dia(dia).value,),
+        )
+        return min(int(resultado.iloc[0, 0]), self.fonte.linhas) if len(resultado) else self.fonte.linhas
+
+    def posicoes_periodo(self, data_inicio, data_fim):
+        return self.posicao(data_inicio), self.posicao(data_fim + timedelta(days=1))
+
+    def periodo(self, data_inicio, data_fim, colunas=None):
+        inicio, fim = self.posicoes_periodo(data_inicio, data_fim)
+        selecao = "*" if colunas is None else colunas_sql(["posicao", *colunas])
+        df = ler(self.fonte, f"SELECT {selecao} FROM {{tabela}} WHERE posicao >= ? AND posicao < ? ORDER BY posicao", (inicio, fim))
+        return por_posicao(do_banco(df))
+
+    def linhas(self, posicoes, colunas):
+        selecao = colunas_sql(["posicao", *colunas])
+        partes = [
+            ler(self.fonte, f"SELECT {selecao} FROM {{tabela}} WHERE posicao IN ({marcadores(bloco)}) ORDER BY posicao", tuple(bloco.tolist()))
+            for bloco in np.array_split(posicoes, max(1, -(-len(posicoes) // MAXIMO_PARAMETROS)))
+        ]
+        df = pd.concat(partes) if len(partes) > 1 else partes[0]
+        return por_posicao(do_banco(df))
+
+    def vendedores(self, data_inicio, data_fim, limite_atraso):
+        """A tabela de tabela_vendedores, calculada por um GROUP BY no banco."""
+        inicio, fim = self.posicoes_periodo(data_inicio, data_fim)
+        lenta, no_prazo = "tempo_entrega > :limite", "tempo_entrega <= :limite"
+        df = consultar(self.fonte, f"""
+            SELECT seller_id,
+                   COUNT(*) AS pedidos,
+                   TOTAL(payment_value) AS faturamento,
+                   AVG(payment_value) AS ticket_medio,
+                   AVG(review_score) AS nota_media,
+                   AVG(tempo_entrega) AS tempo_medio,
+                   AVG(atraso) AS pct_atraso,
+                   TOTAL({lenta}) AS entregas_lentas,
+                   TOTAL({no_prazo}) AS entregas_no_prazo,
+                   TOTAL(CASE WHEN {lenta} THEN review_score END) AS nota_lenta_soma,
+                   COUNT(CASE WHEN {lenta} THEN review_score END) AS nota_lenta_cont,
+                   TOTAL(CASE WHEN {no_prazo} THEN review_score END) AS nota_no_prazo_soma,
+                   COUNT(CASE WHEN {no_prazo} THEN review_score END) AS nota_no_prazo_cont
+            FROM {{tabela}}
+            WHERE posicao >= :inicio AND posicao < :fim AND seller_id IS NOT NULL
+            GROUP BY seller_id
+            ORDER BY seller_id""", {"inicio": inicio, "fim": fim, "limite": limite_atraso})
+        return do_banco(df).set_index("seller_id")
+
+
+@dataclass(frozen=True)
+class CuboSQL:
+    """Mesmas perguntas do CuboVendas, respondidas por agregações SQL sobre o intervalo de posições do período.
+
+    Clientes e lojas distintos saem de COUNT(DISTINCT), então são sempre exatos.
+    """
+    distintos_exatos = True
+
+    fonte: FonteSQL
+
+    def periodo_completo(self):
+        """(primeiro, último) dia com pedidos na base."""
+        limites = consultar(
+            self.fonte, "SELECT order_purchase_timestamp FROM {tabela} WHERE posicao IN (0, ?) ORDER BY posicao", (self.fonte.linhas - 1,),
+        )
+        datas = do_banco(limites)["order_purchase_timestamp"]
+        return datas.iloc[0].date(), datas.iloc[-1].date()
+
+    def agregar(self, data_inicio, data_fim, selecao, resto="", parametros=()):
+        inicio, fim = PedidosSQL(self.fonte).posicoes_periodo(data_inicio, data_fim)
+        sql = f"SELECT {selecao} FROM {{tabela}} WHERE posicao >= ? AND posicao < ? {resto}"
+        return consultar(self.fonte, sql, (inicio, fim, *parametros))
+
+    def kpis(self, data_inicio, data_fim, df_periodo=None):
+        """KPIs da Visão Geral. `df_periodo` é ignorado: a contagem de clientes já é exata."""
+        linha = self.agregar(data_inicio, data_fim, """
+            COUNT(*) AS pedidos, COUNT(DISTINCT customer_id) AS clientes, AVG(payment_value) AS ticket_medio,
+            AVG(tempo_entrega) AS tempo_medio, COUNT(DISTINCT seller_id) AS lojas, AVG(review_score) AS nota_media""").iloc[0]
+        return {
+            "pedidos": int(linha["pedidos"]),
+            "clientes": int(linha["clientes"]),
+            "ticket_medio": float(linha["ticket_medio"]) if pd.notna(linha["ticket_medio"]) else float("nan"),
+            "tempo_medio": float(linha["tempo_medio"]) if pd.notna(linha["tempo_medio"]) else float("nan"),
+            "lojas": int(linha["lojas"]),
+            "nota_media": float(linha["nota_media"]) if pd.notna(linha["nota_media"]) else float("nan"),
+        }
+
+    def serie_mensal(self, data_inicio, data_fim):
+        """Pedidos e ticket médio por ano_mes."""
+        mensal = self.agregar(
+            data_inicio, data_fim, 'ano_mes, COUNT(*) AS "Pedidos", AVG(payment_value) AS payment_value', "GROUP BY ano_mes ORDER BY ano_mes",
+        )
+        # Aqui ano_mes é o rótulo do eixo, em texto como no CuboVendas, e não a coluna categórica dos pedidos.
+        return do_banco(mensal).astype({"ano_mes": str})
+
+    def pedidos_por(self, data_inicio, data_fim, dimensao):
+        """Pedidos por estado, categoria ou loja no período, do maior para o menor."""
+        contagem = self.agregar(
+            data_inicio, data_fim, f'"{dimensao}", COUNT(*) AS pedidos',
+            f'AND "{dimensao}" IS NOT NULL GROUP BY "{dimensao}" ORDER BY pedidos DESC, "{dimensao}"',
+        )
+        # Sem pedidos no período o SQLite devolve zero linhas, e a coluna viria sem tipo (object).
+        return do_banco(contagem).set_index(dimensao)["pedidos"].astype("int64")
+
+    def media_por(self, data_inicio, data_fim, dimensao, medida):
+        """Média de uma medida ("valor", "tempo", "nota" ou "frete") por dimensão no período."""
+        coluna = MEDIDAS_SQL[medida]
+        medias = self.agregar(
+            data_inicio, data_fim, f'"{dimensao}", AVG("{coluna}") AS media',
+            f'AND "{dimensao}" IS NOT NULL GROUP BY "{dimensao}" HAVING COUNT("{coluna}") > 0',
+        )
+        return do_banco(medias).set_index(dimensao)["media"].astype("float64").rename(None)
+
+
+@dataclass(frozen=True)
+class IndiceSQL:
+    """Mesma interface do IndiceLocal, sobre o índice (customer_state, customer_city) do banco."""
+    fonte: FonteSQL
+
+    def posicoes(self, estados, cidades=(), inicio=0, fim=None):
+        """Posições (crescentes) das linhas dos estados, e das cidades se dadas, dentro de [inicio, fim)."""
+        fim = self.fonte.linhas if fim is None else min(fim, self.fonte.linhas)
+        filtro = f"customer_state IN ({marcadores(estados)})"
+        if cidades:
+            filtro += f" AND customer_city IN ({marcadores(cidades)})"
+        resultado = consultar(
+            self.fonte,
+            f"SELECT posicao FROM {{tabela}} WHERE {filtro} AND posicao >= ? AND posicao < ? ORDER BY posicao",
+            (*estados, *cidades, inicio, fim),
+        )
+        return resultado["posicao"].to_numpy(dtype=np.int64)
+
+    def cidades_da_regiao(self, estados):
+        """Nomes das cidades dos estados dados, em ordem alfabética."""
+        resultado = consultar(
+            self.fonte,
+            f"SELECT DISTINCT customer_city FROM {{tabela}} WHERE customer_state IN ({marcadores(estados)}) "
+            "AND posicao < ? AND customer_city IS NOT NULL ORDER BY customer_city",
+            (*estados, self.fonte.linhas),
+        )
+        return resultado["customer_city"].tolist()
+
+
+if __name__ == "__main__":
+    # Etapa de ingestão do backend SQL: `python sql_marketplace.py` monta o banco a partir do CSV.
+    gerar_banco()
+    print(f"{ler_fonte().linhas:,} pedidos gravados em {ARQUIVO_BANCO}")